@@ -0,0 +1,145 @@
+import asyncio
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+
+
+class _RequestState:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned: bool):
+        self.pinned = pinned  # the client wrote recently (pin cookie)
+        self.wrote = False    # this request wrote
+
+
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+_request_state: ContextVar[Optional[_RequestState]] = ContextVar("replica_request_state", default=None)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads inside the block go to the replica (see ReplicaRouter for when they don't).
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_replica(view):
+    """
+    Per-view opt-in to replica reads, for function views and viewset actions alike.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaChangelistMixin:
+    """
+    ModelAdmin mixin serving changelists from the replica. The response is rendered
+    inside the block because the result page is only fetched by the template.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, "render"):
+                response.render()
+        return response
+
+
+class ReplicaRouter:
+    """
+    Writes go to the primary. Reads go to the replica only inside replica_reads()
+    (views opted in with use_replica), and even then stay on the primary while
+    - the client holds the pin cookie set after one of its own writes,
+    - this request has written anything,
+    - or a transaction is open on the primary,
+    so a user always reads their own writes despite replication lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes across requests: after a request that wrote, the client gets
+    a cookie that keeps its replica-enabled views on the primary for
+    DATABASE_REPLICA_STICKY_SECONDS. Sits outside SessionMiddleware so session
+    saves (logins) count as writes.
+
+    Sync and async. sync_to_async copies the context into its thread, so views
+    run there share this request's state object and their writes are seen here.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    @staticmethod
+    def start(request) -> _RequestState:
+        return _RequestState(pinned=getattr(settings, "DATABASE_REPLICA_PIN_COOKIE", "db_primary") in request.COOKIES)
+
+    @staticmethod
+    def finish(state: _RequestState, response):
+        if state.wrote:
+            response.set_cookie(getattr(settings, "DATABASE_REPLICA_PIN_COOKIE", "db_primary"), "1",
+                                max_age=getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 10),
+                                httponly=True, samesite="Lax")
+        return response
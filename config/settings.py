@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,14 +47,18 @@ INSTALLED_APPS = [
     "location",
     "rating",
     "web.apps.WebConfig",
+    "diagnostics.apps.DiagnosticsConfig",
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'diagnostics.middleware.QueryInstrumentationMiddleware',
+    'config.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'diagnostics.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -100,12 +107,47 @@ REST_FRAMEWORK = {
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Database profile, picked with DJANGO_DB_PROFILE:
+#   development: stock SQLite, one connection per request.
+#   production: persistent connections, and SQLite in WAL mode with a busy timeout
+#   and the pragmas below (set on every new connection by config.db), so writers
+#   wait their turn instead of failing with "database is locked".
+# DJANGO_DB_NAME moves the database file (e.g. onto a data volume).
+DB_PROFILE = os.environ.get("DJANGO_DB_PROFILE", "development")
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get("DJANGO_DB_NAME", BASE_DIR / 'db.sqlite3'),
     }
 }
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == "production":
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    SQLITE_PRAGMAS = {
+        "journal_mode": "wal",        # readers no longer block the writer, or it them
+        "synchronous": "normal",      # fsync at checkpoints only; safe with WAL
+        "busy_timeout": 20000,        # ms to wait for the write lock
+        "cache_size": -65536,         # 64 MiB page cache per connection
+        "temp_store": "memory",
+        "mmap_size": 268435456,       # 256 MiB
+        "wal_autocheckpoint": 1000,   # pages
+    }
+elif DB_PROFILE != "development":
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_PROFILE {DB_PROFILE!r} (expected development or production)")
+
+# Read replica: with DJANGO_DB_REPLICA_NAME set, a "replica" alias (same engine and
+# profile) serves the reads of views opted in with config.routers.use_replica, and
+# ReplicaPinMiddleware keeps a client on the primary for DATABASE_REPLICA_STICKY_SECONDS
+# after its own writes. Locally the replica is a second SQLite file refreshed by
+# `manage.py sync_replica`; for Postgres, point the alias at a standby in a settings override.
+DB_REPLICA_NAME = os.environ.get("DJANGO_DB_REPLICA_NAME")
+if DB_REPLICA_NAME:
+    DATABASES['replica'] = dict(DATABASES['default'], NAME=DB_REPLICA_NAME, TEST={'MIRROR': 'default'})
+    DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = 10
+DATABASE_REPLICA_PIN_COOKIE = "db_primary"
 
 
 # Password validation
@@ -157,6 +199,149 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 STATIC_URL = '/static/'
 
+
+# Ride dispatch
+
+# Driver spatial index: grid cell size in degrees (~2.2km) and how often each
+# process reloads it from the database to pick up other workers' writes.
+# With the index disabled, candidates come from an SQL bounding-box query.
+RIDE_DRIVER_INDEX_ENABLED = True
+RIDE_DRIVER_GRID_CELL_DEG = 0.02
+RIDE_DRIVER_INDEX_REFRESH_SECONDS = 30
+
+# Driver location pings are buffered and written with one bulk UPDATE per interval
+# (or as soon as this many drivers are pending). Pings older than the driver's
+# newest accepted one, or stamped further than the skew ahead of the server
+# clock, are dropped. A batch POST carries at most RIDE_LOCATION_MAX_BATCH pings.
+RIDE_LOCATION_FLUSH_SECONDS = 5
+RIDE_LOCATION_MAX_PENDING = 5000
+RIDE_LOCATION_MAX_FUTURE_SKEW_SECONDS = 30
+RIDE_LOCATION_MAX_BATCH = 100
+
+# Where driver matching for new ride requests runs: "inline" (during the request),
+# "thread" (in-process pool) or "database" (queued for `manage.py run_dispatch_worker`,
+# which must be running or nothing gets matched). Inline and thread match against the
+# web process' own driver index, which follows that process' writes at once but other
+# processes' only on the periodic reload (up to RIDE_DRIVER_INDEX_REFRESH_SECONDS
+# stale). The dispatch worker reloads its index before a claimed batch, wave timer run
+# or batch tick whenever it is older than RIDE_DISPATCH_INDEX_MAX_AGE_SECONDS.
+RIDE_DISPATCH_BACKEND = "database"
+RIDE_DISPATCH_INDEX_MAX_AGE_SECONDS = 1
+RIDE_DISPATCH_LEASE_SECONDS = 60
+RIDE_DISPATCH_MAX_ATTEMPTS = 3
+
+# Requests are offered in waves of (radius_km, drivers), nearest first. When a wave
+# goes unanswered for RIDE_DISPATCH_WAVE_TIMEOUT_SECONDS its offers expire and a wave
+# timer moves on to the next, wider wave: the dispatch worker's, or under the inline
+# and thread backends a thread in each web process, checking every
+# RIDE_DISPATCH_WAVE_TICK_SECONDS. Turning RIDE_DISPATCH_WAVE_TIMER off there leaves
+# requests at the first wave (check ride.W002).
+RIDE_DISPATCH_WAVES = [(3.0, 3), (5.0, 5), (8.0, 8), (12.0, 12)]
+RIDE_DISPATCH_WAVE_TIMEOUT_SECONDS = 20
+RIDE_DISPATCH_WAVE_TIMER = True
+RIDE_DISPATCH_WAVE_TICK_SECONDS = 1
+
+# "waves" offers each request to its nearest drivers as it arrives; "batch"
+# leaves new requests to the dispatch worker, which every RIDE_BATCH_TICK_SECONDS
+# assigns all waiting requests in a city to free drivers at minimum total ETA.
+# One worker runs a given city's tick at a time: it holds that city's
+# BatchCityClaim lease (RIDE_BATCH_LEASE_SECONDS, longer than a tick) while it
+# assigns, and other workers skip the city until it is released or expires.
+RIDE_MATCHING_STRATEGY = "waves"
+RIDE_BATCH_TICK_SECONDS = 3
+RIDE_BATCH_MAX_RADIUS_KM = 8.0
+RIDE_BATCH_LEASE_SECONDS = 30
+
+# ETAs use average speeds learned per zone (pickup grid cell of this many
+# degrees) and hour of week by `manage.py build_speed_table`; buckets with fewer
+# rides than RIDE_SPEED_MIN_SAMPLES fall back to coarser averages.
+RIDE_SPEED_ZONE_DEG = 0.05
+RIDE_SPEED_MIN_SAMPLES = 5
+
+# Live surge per zone (pickup grid cell of RIDE_SURGE_ZONE_DEG degrees) from
+# in-memory open request / available driver counts, recomputed every
+# RIDE_SURGE_RECOMPUTE_SECONDS. The counts follow this process' writes at once
+# and everyone else's on the reseed from the database every
+# RIDE_SURGE_RESEED_SECONDS (drivers come from the driver index, itself up to
+# RIDE_DRIVER_INDEX_REFRESH_SECONDS old). While enabled, PricingConfig.surge_multiplier
+# is the floor: a zone's live multiplier only applies when it is higher.
+RIDE_SURGE_ENABLED = True
+RIDE_SURGE_ZONE_DEG = 0.02
+RIDE_SURGE_RECOMPUTE_SECONDS = 15
+RIDE_SURGE_RESEED_SECONDS = 30
+RIDE_SURGE_MIN_DEMAND = 3
+RIDE_SURGE_SENSITIVITY = 0.5
+RIDE_SURGE_MAX = 3.0
+
+# PricingConfig rows are cached per process. Edits bump a version stamp in the
+# default cache, which other workers check every RIDE_PRICING_CACHE_CHECK_SECONDS.
+# That only works across processes with a shared CACHES backend (Redis/Memcached);
+# with the default per-process LocMemCache, another worker keeps quoting an edited
+# tariff for up to RIDE_PRICING_CACHE_TTL_SECONDS (`check --deploy` warns, ride.W001).
+RIDE_PRICING_CACHE_TTL_SECONDS = 30
+RIDE_PRICING_CACHE_CHECK_SECONDS = 2
+
+# Quote previews are cached per (pickup cell, dropoff cell, tariff, tariff version);
+# 0.001 degree cells are roughly 110m across.
+RIDE_QUOTE_CELL_DEG = 0.001
+RIDE_QUOTE_CACHE_SIZE = 10000
+RIDE_QUOTE_CACHE_TTL_SECONDS = 60
+
+# Rider status long-poll: how long a request may wait for a change. While it waits
+# the server reads the request's status marker from the default cache every
+# RIDE_STATUS_CHECK_INTERVAL_SECONDS and only reloads the request when the marker
+# moves, or every RIDE_STATUS_FULL_CHECK_SECONDS regardless. Changes made by other
+# processes move the marker only if CACHES is shared; otherwise the full check
+# bounds how late a waiting rider sees them.
+RIDE_STATUS_LONGPOLL_SECONDS = 25
+RIDE_STATUS_CHECK_INTERVAL_SECONDS = 1
+RIDE_STATUS_FULL_CHECK_SECONDS = 10
+
+# Expiry policy, applied by `manage.py expire_ride_requests`: open requests live
+# RIDE_REQUEST_TTL_SECONDS, unanswered driver matches RIDE_MATCH_TTL_SECONDS.
+RIDE_REQUEST_TTL_SECONDS = 600
+RIDE_MATCH_TTL_SECONDS = 120
+RIDE_EXPIRY_BATCH_SIZE = 500
+
+# Per-view query instrumentation (diagnostics app): budgets are keyed by URL name
+# and cap the queries of a single request. Over budget, "log" warns and "raise"
+# fails the request (set it in test settings). Aggregates: /diagnostics/queries/.
+DIAGNOSTICS_ENABLED = True
+DIAGNOSTICS_QUERY_BUDGETS = {
+    "ride-list": 5,
+    "ride-my-rides": 5,
+    "ride-request-my-requests": 5,
+    "ride-request-match-list": 5,
+    "customer_dashboard": 7,
+    "driver_dashboard": 7,
+    "poll_request_status": 6,
+}
+DIAGNOSTICS_DEFAULT_QUERY_BUDGET = None
+DIAGNOSTICS_BUDGET_ACTION = "log"
+
+# Prometheus metrics on /metrics. Each worker keeps its own counts; to report
+# totals under a multi-worker server, point DIAGNOSTICS_METRICS_DIR at a directory
+# shared by the workers of one deployment (emptied before they start), where each
+# writes its counts every DIAGNOSTICS_METRICS_FLUSH_SECONDS. None keeps them in-process.
+# Scrapers authenticate with DIAGNOSTICS_METRICS_TOKEN as a bearer token; without
+# one, only staff sessions can read /metrics. Database-backed gauges are re-read at
+# most every DIAGNOSTICS_METRICS_GAUGE_SECONDS per process.
+DIAGNOSTICS_METRICS_DIR = None
+DIAGNOSTICS_METRICS_FLUSH_SECONDS = 5
+DIAGNOSTICS_METRICS_TOKEN = None
+DIAGNOSTICS_METRICS_GAUGE_SECONDS = 15
+
+# On-demand request profiling: a staff user sends "X-Profile: 1" (cProfile) or
+# "X-Profile: sample" (pyinstrument, if installed), or adds ?__profile=1, and the
+# profile plus the request's SQL timeline land in DIAGNOSTICS_PROFILE_DIR, listed
+# at /diagnostics/profiles/. Only the newest DIAGNOSTICS_PROFILE_KEEP are kept.
+# Read at startup: while off, the middleware drops out of the chain.
+DIAGNOSTICS_PROFILING_ENABLED = False
+DIAGNOSTICS_PROFILE_HEADER = "X-Profile"
+DIAGNOSTICS_PROFILE_QUERY_PARAM = "__profile"
+DIAGNOSTICS_PROFILE_DIR = BASE_DIR / "var" / "request-profiles"
+DIAGNOSTICS_PROFILE_KEEP = 50
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -3,9 +3,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from diagnostics.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("ride.urls")),  # <-- DRF routes we added
+    path("diagnostics/", include("diagnostics.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("web.urls")),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,275 @@
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# seconds; Prometheus' defaults plus a few sub-millisecond steps for in-memory work
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str]):
+        self.registry, self.name, self.help, self.labelnames = registry, name, help, tuple(labelnames)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self.registry._inc(self.name, _label_values(self.labelnames, labels), amount)
+
+
+class Histogram:
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str],
+                 buckets: Sequence[float]):
+        self.registry, self.name, self.help, self.labelnames = registry, name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        self.registry._observe(self, _label_values(self.labelnames, labels), value)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+
+class Gauge:
+    """
+    Read at scrape time from `fn`, in the process that serves /metrics; meant for
+    values the database already knows (so there is nothing to aggregate). The
+    value is reused for `max_age` seconds, so frequent or repeated scrapes do not
+    re-run the query each time.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], max_age: float = 0.0):
+        self.name, self.help, self.fn = name, help, fn
+        self.max_age = max_age
+        self._value: Optional[float] = None
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def value(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if self._value is None or now - self._read_at >= self.max_age:
+                self._value, self._read_at = float(self.fn()), now
+            return self._value
+
+
+def _label_values(labelnames: Tuple[str, ...], labels: dict) -> Labels:
+    return tuple(str(labels.get(n, "")) for n in labelnames)
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms for this process, plus scrape-time gauges.
+
+    Under a multi-worker server every process holds its own values. With
+    `directory` set, each one writes its state to `<directory>/metrics-<pid>.json`
+    at most every `flush_seconds` (and at exit), and `collect()` sums its live
+    values with every other process' file, so whichever worker answers /metrics
+    reports totals for the deployment. Files of exited workers are kept: their
+    counts still belong in the totals. Empty the directory before the workers start.
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_seconds: float = 5.0, gauge_max_age: float = 0.0):
+        self.directory = Path(directory) if directory else None
+        self.flush_seconds = flush_seconds
+        self.gauge_max_age = gauge_max_age
+        self._metrics: Dict[str, object] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # per series: one count per bucket (not cumulative), then +Inf, sum
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._gauges: Dict[str, Gauge] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flushed_at = time.monotonic()
+        self._dirty = False
+        atexit.register(self.flush)
+
+    # -- definitions --
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._define(name, Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._define(name, Histogram(self, name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float], max_age: Optional[float] = None) -> Gauge:
+        gauge = self._define(name, Gauge(name, help, fn, self.gauge_max_age if max_age is None else max_age))
+        self._gauges[name] = gauge
+        return gauge
+
+    def _define(self, name, metric):
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {name} is already defined as a {type(existing).__name__}")
+                return existing
+            self._metrics[name] = metric
+            return metric
+
+    # -- updates --
+
+    def _check_fork(self) -> None:
+        # a worker forked from a process that already counted starts from zero
+        if os.getpid() != self._pid:
+            self._counters, self._histograms = {}, {}
+            self._pid = os.getpid()
+
+    def _inc(self, name: str, labels: Labels, amount: float) -> None:
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+            self._dirty = True
+        self._maybe_flush()
+
+    def _observe(self, histogram: Histogram, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._check_fork()
+            key = (histogram.name, labels)
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0.0] * (len(histogram.buckets) + 2)
+            series[bisect_left(histogram.buckets, value)] += 1
+            series[-1] += value
+            self._dirty = True
+        self._maybe_flush()
+
+    # -- per-process files --
+
+    def _maybe_flush(self) -> None:
+        if self.directory is not None and time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self.flush()
+
+    def _state(self) -> dict:
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+            "histograms": [[name, list(labels), series] for (name, labels), series in self._histograms.items()],
+        }
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        with self._lock:
+            self._check_fork()
+            self._flushed_at = time.monotonic()
+            if not self._dirty:
+                return
+            state = json.dumps(self._state())
+            self._dirty = False
+        path = self.directory / f"metrics-{self._pid}.json"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(state)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception("Could not write metrics to %s", path)
+
+    def _other_processes(self) -> Iterable[dict]:
+        if self.directory is None or not self.directory.is_dir():
+            return
+        own = f"metrics-{os.getpid()}.json"
+        for path in self.directory.glob("metrics-*.json"):
+            if path.name == own:
+                continue
+            try:
+                yield json.loads(path.read_text())
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable metrics file %s", path)
+
+    # -- reads --
+
+    def collect(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+        """
+        (counters, histograms) summed over this process and the other processes' files.
+        """
+        with self._lock:
+            self._check_fork()
+            counters = dict(self._counters)
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+        for state in self._other_processes():
+            for name, labels, value in state.get("counters", []):
+                key = (name, tuple(labels))
+                counters[key] = counters.get(key, 0.0) + value
+            for name, labels, series in state.get("histograms", []):
+                key = (name, tuple(labels))
+                mine = histograms.get(key)
+                if mine is None:
+                    histograms[key] = list(series)
+                elif len(mine) == len(series):
+                    histograms[key] = [a + b for a, b in zip(mine, series)]
+        return counters, histograms
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        counters, histograms = self.collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            if isinstance(metric, Counter):
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} counter"]
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_num(value)}")
+            elif isinstance(metric, Histogram):
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} histogram"]
+                for (n, labels), series in sorted(histograms.items()):
+                    if n != name or len(series) != len(metric.buckets) + 2:
+                        continue
+                    cumulative = 0.0
+                    for le, count in zip(list(metric.buckets) + ["+Inf"], series[:-1]):
+                        cumulative += count
+                        bound = le if le == "+Inf" else _num(le)
+                        lines.append(f"{name}_bucket{_format_labels(metric.labelnames + ('le',), labels + (bound,))} "
+                                     f"{_num(cumulative)}")
+                    base = _format_labels(metric.labelnames, labels)
+                    lines.append(f"{name}_sum{base} {_num(series[-1])}")
+                    lines.append(f"{name}_count{base} {_num(cumulative)}")
+            elif isinstance(metric, Gauge):
+                try:
+                    value = metric.value()
+                except Exception:
+                    logger.exception("Gauge %s failed", name)
+                    continue
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+metrics = MetricsRegistry(
+    directory=getattr(settings, "DIAGNOSTICS_METRICS_DIR", None),
+    flush_seconds=getattr(settings, "DIAGNOSTICS_METRICS_FLUSH_SECONDS", 5),
+    gauge_max_age=getattr(settings, "DIAGNOSTICS_METRICS_GAUGE_SECONDS", 15),
+)
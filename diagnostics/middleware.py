@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .querystats import QueryRecorder, query_stats
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(view: str):
+    return getattr(settings, "DIAGNOSTICS_QUERY_BUDGETS", {}).get(
+        view, getattr(settings, "DIAGNOSTICS_DEFAULT_QUERY_BUDGET", None))
+
+
+_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+
+
+def forward_to_recorder(execute, sql, params, many, context):
+    """
+    Execute wrapper kept on every connection (see install_forwarder): passes each
+    query to the recorder of the current request, if any.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_forwarder(connection) -> None:
+    """
+    Connections are per thread, and under ASGI a request's queries run on
+    sync_to_async threads whose connections the coroutine cannot reach. So each
+    connection carries forward_to_recorder permanently (installed when it opens),
+    and the recorder travels in a ContextVar, which sync_to_async copies.
+    """
+    if forward_to_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(forward_to_recorder)
+
+
+@receiver(connection_created)
+def install_forwarder_on_connect(sender, connection, **kwargs):
+    install_forwarder(connection)
+
+
+@contextmanager
+def recording(recorder: QueryRecorder):
+    for alias in connections:
+        install_forwarder(connections[alias])
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts the queries and DB time of every request and folds them into per-view
+    aggregates under the URL name. A request over its DIAGNOSTICS_QUERY_BUDGETS
+    entry is logged, or raises QueryBudgetExceeded when DIAGNOSTICS_BUDGET_ACTION
+    is "raise" (meant for tests). Sync and async: under ASGI it must not force
+    the async long-poll views onto a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not getattr(settings, "DIAGNOSTICS_ENABLED", True):
+            return self.get_response(request)
+        with recording(QueryRecorder()) as recorder:
+            response = self.get_response(request)
+        self.record(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, "DIAGNOSTICS_ENABLED", True):
+            return await self.get_response(request)
+        with recording(QueryRecorder()) as recorder:
+            response = await self.get_response(request)
+        self.record(request, recorder)
+        return response
+
+    def record(self, request, recorder: QueryRecorder) -> None:
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name or match._func_path) if match else "<unresolved>"
+        budget = query_budget(view)
+        if query_stats.record(view, recorder, budget):
+            message = (f"{request.method} {request.path} ({view}) ran {recorder.count} queries, "
+                       f"budget {budget}; slowest {recorder.slowest_ms:.1f} ms: {recorder.slowest_sql}")
+            if getattr(settings, "DIAGNOSTICS_BUDGET_ACTION", "log") == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
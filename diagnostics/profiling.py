@@ -0,0 +1,175 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .querystats import QueryTimeline
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # "sample" falls back to cProfile
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_RE = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{6}$")
+PROFILE_FILES = ("json", "txt", "prof", "html")
+TOP_FUNCTIONS = 60
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, "DIAGNOSTICS_PROFILE_DIR", Path(settings.BASE_DIR) / "var" / "request-profiles"))
+
+
+def requested_mode(request) -> Optional[str]:
+    """
+    "cprofile" (deterministic) or "sample" when the request asks to be profiled
+    through the DIAGNOSTICS_PROFILE_HEADER header or DIAGNOSTICS_PROFILE_QUERY_PARAM.
+    """
+    value = (request.headers.get(getattr(settings, "DIAGNOSTICS_PROFILE_HEADER", "X-Profile"))
+             or request.GET.get(getattr(settings, "DIAGNOSTICS_PROFILE_QUERY_PARAM", "__profile")))
+    if not value or value.lower() in ("0", "false", "off"):
+        return None
+    return "sample" if value.lower() == "sample" else "cprofile"
+
+
+class RequestProfilerMiddleware:
+    """
+    Profiles a single request on demand: when a staff user sends the profiling
+    header (or query flag) and DIAGNOSTICS_PROFILING_ENABLED is on, the rest of
+    the stack runs under cProfile (or pyinstrument for "sample", if installed)
+    with every SQL statement timed. The result goes to DIAGNOSTICS_PROFILE_DIR
+    and its id comes back in the X-Profile-Id response header.
+
+    Must come after AuthenticationMiddleware. Only session logins count as staff
+    here; DRF authenticates Basic/token clients inside the view.
+
+    Sync-only, since cProfile follows a single thread. While profiling is disabled
+    it removes itself from the chain, so it never puts async views on a thread;
+    while enabled under ASGI, it does.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "DIAGNOSTICS_PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        user = getattr(request, "user", None)
+        if mode is None or user is None or not user.is_staff:
+            return self.get_response(request)
+
+        if mode == "sample" and SamplingProfiler is None:
+            mode = "cprofile"
+        if mode == "sample":
+            profiler = SamplingProfiler()
+            start, stop = profiler.start, profiler.stop
+        else:
+            profiler = cProfile.Profile()
+            start, stop = profiler.enable, profiler.disable
+        timeline = QueryTimeline()
+        started_at = timezone.now()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timeline))
+            t0 = time.perf_counter()
+            start()
+            try:
+                response = self.get_response(request)
+            finally:
+                stop()
+            wall_ms = (time.perf_counter() - t0) * 1000.0
+
+        profile_id = f"{started_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        match = getattr(request, "resolver_match", None)
+        meta = {
+            "id": profile_id,
+            "mode": mode,
+            "started_at": started_at.isoformat(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": (match.view_name or match._func_path) if match else None,
+            "user": user.get_username(),
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 3),
+            "db_ms": round(timeline.total_ms, 3),
+            "query_count": len(timeline.queries),
+            "queries": timeline.queries,
+        }
+        try:
+            save_profile(profile_id, meta, profiler, mode)
+        except OSError:
+            logger.exception("Could not write request profile %s", profile_id)
+        else:
+            response["X-Profile-Id"] = profile_id
+        return response
+
+
+def save_profile(profile_id: str, meta: dict, profiler, mode: str) -> None:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    if mode == "sample":
+        (directory / f"{profile_id}.html").write_text(profiler.output_html())
+        summary = profiler.output_text(unicode=False, color=False)
+    else:
+        profiler.dump_stats(str(directory / f"{profile_id}.prof"))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        summary = out.getvalue()
+    slowest = sorted(meta["queries"], key=lambda q: q["ms"], reverse=True)[:10]
+    (directory / f"{profile_id}.txt").write_text(
+        f"{meta['method']} {meta['path']} -> {meta['status']}  {meta['wall_ms']:.1f} ms wall, "
+        f"{meta['query_count']} queries / {meta['db_ms']:.1f} ms DB\n\n"
+        + "".join(f"{q['ms']:>9.3f} ms @ {q['at_ms']:>9.3f}  {q['sql']}\n" for q in slowest)
+        + "\n" + summary
+    )
+    # the metadata goes last: listings only show profiles whose files are complete
+    (directory / f"{profile_id}.json").write_text(json.dumps(meta, indent=1))
+    prune_profiles(getattr(settings, "DIAGNOSTICS_PROFILE_KEEP", 50))
+
+
+def list_profiles() -> List[dict]:
+    """
+    Metadata (without the SQL timeline) of the stored profiles, newest first.
+    """
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    rows = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        meta.pop("queries", None)
+        meta["files"] = [ext for ext in PROFILE_FILES if (directory / f"{path.stem}.{ext}").exists()]
+        rows.append(meta)
+    return rows
+
+
+def profile_file(profile_id: str, ext: str) -> Optional[Path]:
+    if not PROFILE_ID_RE.match(profile_id) or ext not in PROFILE_FILES:
+        return None
+    path = profile_dir() / f"{profile_id}.{ext}"
+    return path if path.is_file() else None
+
+
+def prune_profiles(keep: int) -> None:
+    directory = profile_dir()
+    ids = sorted({p.stem for p in directory.iterdir() if PROFILE_ID_RE.match(p.stem)}, reverse=True)
+    for stale in ids[keep:]:
+        for ext in PROFILE_FILES:
+            (directory / f"{stale}.{ext}").unlink(missing_ok=True)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+SQL_PREVIEW_CHARS = 500
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper (see `connection.execute_wrapper`) counting the queries
+    run while it is installed, their total time and the slowest statement.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = ""
+        # an async request's queries may run on several threads
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                self.count += 1
+                self.total_ms += ms
+                if ms > self.slowest_ms:
+                    self.slowest_ms = ms
+                    self.slowest_sql = sql[:SQL_PREVIEW_CHARS]
+
+
+class QueryTimeline:
+    """
+    Execute wrapper keeping every statement with its start offset (ms since the
+    timeline was created) and duration, for one profiled request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries: List[dict] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "at_ms": round((t0 - self.started) * 1000.0, 3),
+                "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+                "sql": sql[:SQL_PREVIEW_CHARS],
+                "many": many,
+                "alias": context["connection"].alias,
+            })
+
+    @property
+    def total_ms(self) -> float:
+        return sum(q["ms"] for q in self.queries)
+
+
+@dataclass
+class ViewQueryStats:
+    view: str
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    db_ms: float = 0.0
+    max_db_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_sql: str = ""
+    budget: Optional[int] = None
+    over_budget: int = 0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["avg_queries"] = round(self.queries / self.requests, 2) if self.requests else 0
+        data["avg_db_ms"] = round(self.db_ms / self.requests, 3) if self.requests else 0
+        for key in ("db_ms", "max_db_ms", "slowest_ms"):
+            data[key] = round(data[key], 3)
+        return data
+
+
+class QueryStatsRegistry:
+    """
+    Per-view aggregates for this process, keyed by URL name.
+    """
+
+    def __init__(self):
+        self._views: Dict[str, ViewQueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, view: str, recorder: QueryRecorder, budget: Optional[int] = None) -> bool:
+        """
+        Fold one request into the view's aggregates; True if it went over `budget`.
+        """
+        over = budget is not None and recorder.count > budget
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewQueryStats(view)
+            stats.requests += 1
+            stats.queries += recorder.count
+            stats.max_queries = max(stats.max_queries, recorder.count)
+            stats.db_ms += recorder.total_ms
+            stats.max_db_ms = max(stats.max_db_ms, recorder.total_ms)
+            if recorder.slowest_ms > stats.slowest_ms:
+                stats.slowest_ms = recorder.slowest_ms
+                stats.slowest_sql = recorder.slowest_sql
+            stats.budget = budget
+            stats.over_budget += over
+        return over
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            rows = [s.as_dict() for s in self._views.values()]
+        return sorted(rows, key=lambda r: r["db_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+
+query_stats = QueryStatsRegistry()
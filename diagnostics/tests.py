@@ -0,0 +1,74 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from profiles.models import Customer, CustomUser
+
+from .metrics import Gauge
+from .middleware import QueryBudgetExceeded, QueryInstrumentationMiddleware
+from .querystats import query_stats
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="rider", email="rider@example.com",
+                                                   phone_number="0", password="pw")
+        Customer.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        query_stats.reset()
+
+    @override_settings(DIAGNOSTICS_BUDGET_ACTION="raise", DIAGNOSTICS_QUERY_BUDGETS={"ride-my-rides": 1})
+    def test_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/rides/my_rides/")
+        stats = {row["view"]: row for row in query_stats.snapshot()}
+        self.assertEqual(stats["ride-my-rides"]["over_budget"], 1)
+
+    @override_settings(DIAGNOSTICS_BUDGET_ACTION="raise", DIAGNOSTICS_QUERY_BUDGETS={"ride-my-rides": 10})
+    def test_within_budget_passes(self):
+        self.assertEqual(self.client.get("/api/rides/my_rides/").status_code, 200)
+
+    def test_async_view_queries_are_counted(self):
+        def select_one():
+            # the test transaction holds locks on the tables setUp wrote
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+        async def view(request):
+            await sync_to_async(select_one)()
+            await sync_to_async(select_one, thread_sensitive=False)()
+            return HttpResponse("ok")
+
+        middleware = QueryInstrumentationMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertEqual(response.content, b"ok")
+        stats = {row["view"]: row for row in query_stats.snapshot()}
+        self.assertEqual(stats["<unresolved>"]["queries"], 2)
+
+
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(username="ops", email="ops@example.com",
+                                                    phone_number="0", password="pw", is_staff=True)
+
+    def test_anonymous_denied_without_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_staff_allowed_without_token(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(DIAGNOSTICS_METRICS_TOKEN="s3cret")
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+    def test_gauge_value_is_reused(self):
+        calls = []
+        gauge = Gauge("test_gauge", "Test.", lambda: calls.append(1) or len(calls), max_age=60)
+        self.assertEqual((gauge.value(), gauge.value()), (1.0, 1.0))
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("queries/", views.query_stats_view, name="diagnostics_query_stats"),
+    path("profiles/", views.profile_list_view, name="diagnostics_profiles"),
+    path("profiles/<str:profile_id>.<str:ext>", views.profile_file_view, name="diagnostics_profile_file"),
+]
@@ -0,0 +1,64 @@
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_GET, require_http_methods
+
+from .metrics import metrics
+from .profiling import SamplingProfiler, list_profiles, profile_dir, profile_file
+from .querystats import query_stats
+
+
+@require_http_methods(["GET", "POST"])
+def query_stats_view(request):
+    """
+    Staff-only JSON dump of this process' per-view query aggregates; POST resets them.
+    """
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    if request.method == "POST":
+        query_stats.reset()
+    return JsonResponse({"views": query_stats.snapshot()})
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Scrapers send DIAGNOSTICS_METRICS_TOKEN as a bearer
+    token; staff sessions get in too. Without a token configured, only staff do.
+    """
+    token = getattr(settings, "DIAGNOSTICS_METRICS_TOKEN", None)
+    scraper = bool(token) and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not (scraper or (request.user.is_authenticated and request.user.is_staff)):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_member_required
+def profile_list_view(request):
+    """
+    Admin-styled listing of the stored request profiles.
+    """
+    context = dict(
+        admin.site.each_context(request),
+        title="Request profiles",
+        profiles=list_profiles(),
+        directory=profile_dir(),
+        enabled=getattr(settings, "DIAGNOSTICS_PROFILING_ENABLED", False),
+        header=getattr(settings, "DIAGNOSTICS_PROFILE_HEADER", "X-Profile"),
+        query_param=getattr(settings, "DIAGNOSTICS_PROFILE_QUERY_PARAM", "__profile"),
+        sampling=SamplingProfiler is not None,
+    )
+    return render(request, "diagnostics/profiles.html", context)
+
+
+@staff_member_required
+def profile_file_view(request, profile_id, ext):
+    path = profile_file(profile_id, ext)
+    if path is None:
+        raise Http404
+    # .prof is binary pstats data for snakeviz / pstats; the rest open in the browser
+    return FileResponse(path.open("rb"), as_attachment=ext == "prof", filename=path.name)
@@ -1,9 +1,10 @@
 from django.contrib import admin
+from config.routers import ReplicaChangelistMixin
 from .models import CustomUser, Driver, Customer
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("username", "email", "first_name", "last_name", "phone_number", "is_active", "is_staff")
     search_fields = ("username", "email", "first_name", "last_name", "phone_number")
     list_filter = ("is_active", "is_staff", "gender")
@@ -12,14 +13,14 @@ class CustomUserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Driver)
-class DriverAdmin(admin.ModelAdmin):
+class DriverAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("user", "vehicle", "is_available", "current_lat", "current_lng")
     search_fields = ("user__username", "user__first_name", "user__last_name")
     autocomplete_fields = ("user", "vehicle")
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("user",)
     search_fields = ("user__username", "user__first_name", "user__last_name")
     autocomplete_fields = ("user", "favourite_locations", "home_location", "work_location")
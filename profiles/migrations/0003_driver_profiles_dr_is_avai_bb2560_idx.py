@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['is_available', 'current_lat', 'current_lng'], name='profiles_dr_is_avai_bb2560_idx'),
+        ),
+    ]
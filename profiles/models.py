@@ -118,7 +118,10 @@ class Driver(models.Model):
     rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal("0.00"))
 
     class Meta:
-        indexes = [models.Index(fields=["is_available"])]
+        indexes = [
+            models.Index(fields=["is_available"]),
+            models.Index(fields=["is_available", "current_lat", "current_lng"]),
+        ]
 
     def __str__(self):
         return f"Driver {self.user.username}"
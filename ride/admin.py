@@ -2,10 +2,11 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Ride, RideRequest, RideRequestMatch, PricingConfig, NegotiationOffer
+from config.routers import ReplicaChangelistMixin
+from .models import Ride, RideRequest, RideRequestMatch, PricingConfig, NegotiationOffer, DispatchTask, BatchCityClaim, TravelSpeed
 
 @admin.register(Ride)
-class RideAdmin(admin.ModelAdmin):
+class RideAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("id", "customer", "driver", "city", "vehicle_type", "status", "payment_method", "requested_at", "amount_total", "amount_paid", "distance_km")
     list_filter = ("status", "payment_method", "requested_at", "city", "vehicle_type")
     search_fields = ("id", "customer__email", "driver__user__email", "pickup_address", "dropoff_address")
@@ -13,7 +14,7 @@ class RideAdmin(admin.ModelAdmin):
     readonly_fields = ("requested_at", "started_at", "ended_at")
 
 @admin.register(RideRequest)
-class RideRequestAdmin(admin.ModelAdmin):
+class RideRequestAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("id", "customer", "city", "vehicle_type", "status", "requested_at", "distance_km", "estimated_amount_low", "estimated_amount_high")
     list_filter = ("status", "requested_at", "city", "vehicle_type")
     search_fields = ("id", "customer__email", "pickup_address", "dropoff_address")
@@ -21,7 +22,7 @@ class RideRequestAdmin(admin.ModelAdmin):
     readonly_fields = ("requested_at",)
 
 @admin.register(RideRequestMatch)
-class RideRequestMatchAdmin(admin.ModelAdmin):
+class RideRequestMatchAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("id", "request", "driver", "vehicle", "status", "distance_to_pickup_km", "eta_to_pickup_min", "created_at")
     list_filter = ("status", "created_at")
     search_fields = ("id", "request__id", "driver__user__email")
@@ -35,8 +36,27 @@ class PricingConfigAdmin(admin.ModelAdmin):
     search_fields = ("city", "vehicle_type")
 
 @admin.register(NegotiationOffer)
-class NegotiationOfferAdmin(admin.ModelAdmin):
+class NegotiationOfferAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ("id", "request", "role", "user", "amount", "created_at")
     list_filter = ("role", "created_at")
     search_fields = ("user__username",)
     autocomplete_fields = ("request", "user")
+
+@admin.register(DispatchTask)
+class DispatchTaskAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("id", "request", "status", "attempts", "claimed_by", "claimed_at", "created_at", "finished_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("id", "request__id", "claimed_by")
+    autocomplete_fields = ("request",)
+    readonly_fields = ("created_at", "claimed_at", "finished_at")
+
+@admin.register(BatchCityClaim)
+class BatchCityClaimAdmin(admin.ModelAdmin):
+    list_display = ("city", "claimed_by", "claimed_until")
+    search_fields = ("city", "claimed_by")
+
+@admin.register(TravelSpeed)
+class TravelSpeedAdmin(admin.ModelAdmin):
+    list_display = ("id", "zone_lat", "zone_lng", "hour_of_week", "samples", "speed_kmh", "built_at")
+    list_filter = ("hour_of_week",)
+    readonly_fields = ("built_at",)
@@ -4,4 +4,5 @@ class RideConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ride"
     def ready(self):
-        from . import signals  # noqa
+        from . import checks, signals  # noqa
+        from config import db  # noqa: connection_created hook for the SQLite pragmas
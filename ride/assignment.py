@@ -0,0 +1,229 @@
+from __future__ import annotations
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .changes import touch_requests
+from .dispatch import default_worker_id, refresh_driver_index
+from .geo import np, bounding_box, EARTH_RADIUS_KM
+from .models import BatchCityClaim, RideRequest, RideRequestStatus, RideRequestMatch, MatchStatus
+from .travel import speed_table, hour_of_week, DEFAULT_PICKUP_SPEED_KMH
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # NumPy Hungarian below
+    linear_sum_assignment = None
+
+# cost given to pairs that must not be matched (too far, already offered)
+INFEASIBLE = 1e9
+
+
+def _require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("Batch matching needs NumPy installed.")
+
+
+def pairwise_distance_km(req_lats, req_lngs, drv_lats, drv_lngs):
+    """
+    (requests x drivers) haversine matrix computed with broadcasting.
+    """
+    _require_numpy()
+    lat1 = np.radians(np.asarray(req_lats, dtype=float))[:, None]
+    lng1 = np.radians(np.asarray(req_lngs, dtype=float))[:, None]
+    lat2 = np.radians(np.asarray(drv_lats, dtype=float))[None, :]
+    lng2 = np.radians(np.asarray(drv_lngs, dtype=float))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _hungarian(cost):
+    # Shortest augmenting path Hungarian algorithm (rows <= cols) with the
+    # inner scan over columns vectorized; O(n^2 m) in the worst case.
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)  # p[j]: row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def solve_assignment(cost) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Minimum-cost one-to-one assignment of rows to columns (rectangular allowed).
+    Uses SciPy when installed, otherwise the NumPy Hungarian implementation.
+    """
+    _require_numpy()
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(cost)
+
+
+# ---- Batch tick ----
+
+@dataclass
+class BatchTickResult:
+    requests: int = 0
+    matches: int = 0
+    elapsed_ms: float = 0.0
+    per_city: Dict[str, int] = field(default_factory=dict)
+    skipped_cities: List[str] = field(default_factory=list)
+
+
+def _waiting_requests():
+    # open requests with no offer outstanding
+    return (RideRequest.objects
+            .filter(status=RideRequestStatus.OPEN)
+            .exclude(matches__status=MatchStatus.PENDING)
+            .order_by("requested_at")
+            .values_list("pk", "city", "pickup_lat", "pickup_lng"))
+
+
+def assign_city(requests: List[tuple], busy_driver_ids, max_radius_km: float) -> List[RideRequestMatch]:
+    """
+    Optimal (request, driver) pairs for one city's waiting requests, minimizing the
+    total pickup ETA. Returns unsaved PENDING matches.
+    """
+    from .services import get_driver_index
+    req_ids = [r[0] for r in requests]
+    req_lats = [float(r[2]) for r in requests]
+    req_lngs = [float(r[3]) for r in requests]
+
+    # candidate drivers: everyone in the index inside the requests' box plus the radius
+    lo_lat, _, lo_lng, _ = bounding_box(min(req_lats), min(req_lngs), max_radius_km)
+    _, hi_lat, _, hi_lng = bounding_box(max(req_lats), max(req_lngs), max_radius_km)
+    drivers = [d for d in get_driver_index().in_box(lo_lat, hi_lat, lo_lng, hi_lng) if d.driver_id not in busy_driver_ids]
+    if not drivers:
+        return []
+
+    dist = pairwise_distance_km(req_lats, req_lngs, [d.lat for d in drivers], [d.lng for d in drivers])
+    how = hour_of_week()
+    speeds = np.array([speed_table.speed_kmh(lat, lng, how=how, default=DEFAULT_PICKUP_SPEED_KMH)
+                       for lat, lng in zip(req_lats, req_lngs)])
+    cost = dist / speeds[:, None] * 60.0
+    cost[dist > max_radius_km] = INFEASIBLE
+    offered = RideRequestMatch.objects.filter(request_id__in=req_ids).values_list("request_id", "driver_id")
+    if offered:
+        row_of = {pk: i for i, pk in enumerate(req_ids)}
+        col_of = {d.driver_id: j for j, d in enumerate(drivers)}
+        for rid, did in offered:
+            if did in col_of:
+                cost[row_of[rid], col_of[did]] = INFEASIBLE
+
+    rows, cols = solve_assignment(cost)
+    out = []
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        if cost[i, j] >= INFEASIBLE:
+            continue
+        d = drivers[j]
+        out.append(RideRequestMatch(
+            request_id=req_ids[i],
+            driver_id=d.driver_id,
+            vehicle_id=d.vehicle_id,
+            status=MatchStatus.PENDING,
+            distance_to_pickup_km=Decimal(str(round(float(dist[i, j]), 2))),
+            eta_to_pickup_min=max(1, int(round(float(cost[i, j])))),
+        ))
+    return out
+
+
+def claim_city(city: str, worker_id: str) -> bool:
+    """
+    Take the batch lease on `city` for RIDE_BATCH_LEASE_SECONDS; False while another
+    worker holds an unexpired lease. The conditional UPDATE is the claim.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "RIDE_BATCH_LEASE_SECONDS", 30))
+    BatchCityClaim.objects.get_or_create(city=city)
+    return BatchCityClaim.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now) | Q(claimed_by=worker_id), city=city,
+    ).update(claimed_by=worker_id, claimed_until=now + lease) == 1
+
+
+def release_city(city: str, worker_id: str) -> None:
+    BatchCityClaim.objects.filter(city=city, claimed_by=worker_id).update(claimed_by="", claimed_until=None)
+
+
+def run_batch_tick(max_radius_km: float = None, worker_id: Optional[str] = None) -> BatchTickResult:
+    """
+    One batched matching pass: per city, gather waiting requests and free drivers,
+    solve the min-ETA assignment and emit one PENDING match per assigned pair.
+
+    Each city is assigned under its BatchCityClaim lease, and its requests and busy
+    drivers are re-read once the lease is held, so concurrent workers never offer
+    a driver to two requests. Cities leased by another worker are skipped this tick.
+    """
+    t0 = time.perf_counter()
+    max_radius_km = max_radius_km or getattr(settings, "RIDE_BATCH_MAX_RADIUS_KM", 8.0)
+    worker_id = worker_id or default_worker_id()
+    by_city: Dict[str, List[int]] = defaultdict(list)
+    for pk, city in _waiting_requests().values_list("pk", "city"):
+        by_city[(city or "").strip().lower()].append(pk)
+    result = BatchTickResult()
+    if by_city:
+        refresh_driver_index()
+    for city, req_ids in by_city.items():
+        if not claim_city(city, worker_id):
+            result.skipped_cities.append(city)
+            continue
+        try:
+            requests = list(_waiting_requests().filter(pk__in=req_ids))
+            if not requests:
+                continue
+            busy = set(RideRequestMatch.objects.filter(status=MatchStatus.PENDING).values_list("driver_id", flat=True))
+            matches = assign_city(requests, busy, max_radius_km)
+            with transaction.atomic():
+                RideRequestMatch.objects.bulk_create(matches, ignore_conflicts=True)
+                touch_requests({m.request_id for m in matches})
+        finally:
+            release_city(city, worker_id)
+        result.requests += len(requests)
+        result.matches += len(matches)
+        result.per_city[city] = len(matches)
+    result.elapsed_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+    return result
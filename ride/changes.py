@@ -0,0 +1,24 @@
+import time
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+STATUS_MARKER_KEY = "ride:request-status:{}"
+STATUS_MARKER_TTL = 3600
+
+
+def touch_requests(request_ids: Iterable[int]) -> None:
+    """
+    Bump the status markers of these ride requests once the current transaction
+    commits (at once outside one). Waiting status long-polls only reload a
+    request when its marker moves.
+    """
+    ids = [pk for pk in request_ids if pk is not None]
+    if ids:
+        transaction.on_commit(lambda: cache.set_many(
+            {STATUS_MARKER_KEY.format(pk): time.time_ns() for pk in ids}, STATUS_MARKER_TTL))
+
+
+def request_marker(request_id: int) -> Optional[int]:
+    return cache.get(STATUS_MARKER_KEY.format(request_id))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .dispatch import BACKEND_DATABASE, STRATEGY_WAVES, dispatch_waves
+
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The pricing config stamp and the status long-poll markers only reach other
+    worker processes through a shared default cache.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [Warning(
+        f"The default cache ({backend.rsplit('.', 1)[-1]}) is not shared between processes.",
+        hint=("With more than one worker, pricing edits reach the other workers only after "
+              "RIDE_PRICING_CACHE_TTL_SECONDS and status long-polls see other workers' changes "
+              "only every RIDE_STATUS_FULL_CHECK_SECONDS. Point CACHES at Redis or Memcached, "
+              "or silence ride.W001 for a single-process deployment."),
+        id="ride.W001",
+    )]
+
+
+@register()
+def check_wave_timers(app_configs, **kwargs):
+    """
+    Waves after the first only fire from a wave timer: the dispatch worker's, or
+    the web process' own under the in-process backends.
+    """
+    if (getattr(settings, "RIDE_MATCHING_STRATEGY", STRATEGY_WAVES) != STRATEGY_WAVES
+            or getattr(settings, "RIDE_DISPATCH_BACKEND", BACKEND_DATABASE) == BACKEND_DATABASE
+            or getattr(settings, "RIDE_DISPATCH_WAVE_TIMER", True)
+            or len(dispatch_waves()) < 2):
+        return []
+    radius_km, count = dispatch_waves()[0]
+    return [Warning(
+        "RIDE_DISPATCH_WAVES has later waves but nothing fires them.",
+        hint=(f"With RIDE_DISPATCH_BACKEND = {settings.RIDE_DISPATCH_BACKEND!r} and RIDE_DISPATCH_WAVE_TIMER "
+              f"off, requests are only ever offered to {count} driver(s) within {radius_km:g} km. "
+              "Enable RIDE_DISPATCH_WAVE_TIMER or use the \"database\" backend with run_dispatch_worker."),
+        id="ride.W002",
+    )]
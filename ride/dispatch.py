@@ -0,0 +1,289 @@
+from __future__ import annotations
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .changes import touch_requests
+from .models import (
+    DispatchTask, DispatchTaskStatus, RideRequest, RideRequestStatus, RideRequestMatch, MatchStatus
+)
+
+logger = logging.getLogger(__name__)
+
+BACKEND_INLINE = "inline"
+BACKEND_THREAD = "thread"
+BACKEND_DATABASE = "database"
+
+STRATEGY_WAVES = "waves"
+STRATEGY_BATCH = "batch"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_wave_timer: Optional[threading.Thread] = None
+_wave_timer_lock = threading.Lock()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def dispatch_waves() -> List[Tuple[float, int]]:
+    return [(float(r), int(n)) for r, n in getattr(settings, "RIDE_DISPATCH_WAVES", [(8.0, 5)])]
+
+
+@dataclass
+class WaveResult:
+    created: int
+    next_wave_at: Optional[datetime]
+
+
+def offer_next_wave(request_id: int, wave: int) -> Optional[WaveResult]:
+    """
+    Offer an open request to wave `wave` (0-based) of RIDE_DISPATCH_WAVES: expire the
+    previous wave's unanswered offers and match the next-nearest drivers within the
+    wave's radius. The wave counter is advanced with a conditional UPDATE, so each
+    wave runs once however many workers see it; returns None if another worker (or
+    an accept/cancel) got there first.
+    """
+    from .services import build_matches_for_request
+    waves = dispatch_waves()
+    if wave >= len(waves):
+        return None
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, "RIDE_DISPATCH_WAVE_TIMEOUT_SECONDS", 20))
+    next_wave_at = now + timeout if wave + 1 < len(waves) else None
+    with transaction.atomic():
+        claimed = RideRequest.objects.filter(
+            pk=request_id, status=RideRequestStatus.OPEN, dispatch_wave=wave,
+        ).update(dispatch_wave=wave + 1, next_wave_at=next_wave_at)
+        if not claimed:
+            return None
+        if wave > 0:
+            RideRequestMatch.objects.filter(request_id=request_id, status=MatchStatus.PENDING).update(status=MatchStatus.EXPIRED)
+            touch_requests([request_id])
+        radius_km, count = waves[wave]
+        req = RideRequest.objects.get(pk=request_id)
+        created = build_matches_for_request(req, limit=count, radius_km=radius_km)
+        if not created and next_wave_at is not None:
+            # nobody to wait for: widen on the next tick instead of after the timeout
+            next_wave_at = now
+            RideRequest.objects.filter(pk=request_id).update(next_wave_at=next_wave_at)
+    return WaveResult(created, next_wave_at)
+
+
+def refresh_driver_index() -> None:
+    """
+    Bring this process' driver index up to date before a batch of dispatch work.
+    A dispatch worker sees none of the web processes' location and availability
+    writes through signals, so instead of every RIDE_DRIVER_INDEX_REFRESH_SECONDS
+    it reloads whenever the index is older than RIDE_DISPATCH_INDEX_MAX_AGE_SECONDS.
+    Under steady traffic that is one driver scan per that period, not per batch.
+    """
+    if getattr(settings, "RIDE_DRIVER_INDEX_ENABLED", True):
+        from .services import get_driver_index
+        get_driver_index(max_age=getattr(settings, "RIDE_DISPATCH_INDEX_MAX_AGE_SECONDS", 1))
+
+
+def run_matching(request_id: int) -> int:
+    """
+    Offer a new request to its first wave of drivers. Safe to run more than once:
+    only the first call finds the request at wave 0.
+    """
+    result = offer_next_wave(request_id, 0)
+    return result.created if result else 0
+
+
+class WaveScheduler:
+    """
+    Min-heap of (due, request id, wave) timers for open requests waiting on their next
+    wave. It is refilled from the indexed `next_wave_at` column every `refresh_seconds`
+    (looking that far ahead), so timers survive restarts and any worker can fire them;
+    each tick only pops what is due instead of rescanning every open request.
+    """
+
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self._heap: List[Tuple[datetime, int, int]] = []
+        self._queued: Set[Tuple[int, int]] = set()
+        self._refreshed_at: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, request_id: int, wave: int, due: datetime) -> None:
+        if (request_id, wave) in self._queued:
+            return
+        self._queued.add((request_id, wave))
+        heapq.heappush(self._heap, (due, request_id, wave))
+
+    def refresh(self, now: datetime) -> None:
+        horizon = now + timedelta(seconds=self.refresh_seconds)
+        due = (RideRequest.objects
+               .filter(status=RideRequestStatus.OPEN, next_wave_at__lte=horizon)
+               .values_list("pk", "dispatch_wave", "next_wave_at"))
+        for pk, wave, at in due.iterator():
+            self.push(pk, wave, at)
+        self._refreshed_at = now
+
+    def run_due(self, now: Optional[datetime] = None) -> int:
+        """
+        Fire every timer that is due; returns how many waves were actually offered.
+        """
+        now = now or timezone.now()
+        if self._refreshed_at is None or (now - self._refreshed_at).total_seconds() >= self.refresh_seconds:
+            self.refresh(now)
+        fired = 0
+        if self._heap and self._heap[0][0] <= now:
+            refresh_driver_index()
+        while self._heap and self._heap[0][0] <= now:
+            _, request_id, wave = heapq.heappop(self._heap)
+            self._queued.discard((request_id, wave))
+            result = offer_next_wave(request_id, wave)
+            if result is None:
+                continue
+            fired += 1
+            if result.next_wave_at is not None:
+                self.push(request_id, wave + 1, result.next_wave_at)
+        return fired
+
+
+def _run_wave_timer(tick_seconds: float):
+    # refresh every tick: requests matched here since the last one must widen on time
+    scheduler = WaveScheduler(refresh_seconds=tick_seconds)
+    while True:
+        try:
+            scheduler.run_due()
+        except Exception:
+            logger.exception("Wave timer tick failed")
+        finally:
+            close_old_connections()
+        time.sleep(tick_seconds)
+
+
+def wave_timer_wanted() -> bool:
+    """
+    True when this process must fire wave timers itself: there is a wave to widen
+    to, and requests are matched in-process (no dispatch worker involved).
+    """
+    return (getattr(settings, "RIDE_MATCHING_STRATEGY", STRATEGY_WAVES) == STRATEGY_WAVES
+            and getattr(settings, "RIDE_DISPATCH_BACKEND", BACKEND_DATABASE) != BACKEND_DATABASE
+            and getattr(settings, "RIDE_DISPATCH_WAVE_TIMER", True)
+            and len(dispatch_waves()) > 1)
+
+
+def ensure_wave_timer() -> None:
+    """
+    Start this process' wave timer thread if it is not running yet. It fires due
+    waves like the dispatch worker does; several processes may run one, since each
+    wave is claimed with a conditional UPDATE. Started on the first matched request,
+    so it picks up timers left by a previous process only once traffic arrives.
+    """
+    global _wave_timer
+    if _wave_timer is not None and _wave_timer.is_alive():
+        return
+    with _wave_timer_lock:
+        if _wave_timer is None or not _wave_timer.is_alive():
+            tick = float(getattr(settings, "RIDE_DISPATCH_WAVE_TICK_SECONDS", 1))
+            _wave_timer = threading.Thread(target=_run_wave_timer, args=(tick,), name="ride-wave-timer", daemon=True)
+            _wave_timer.start()
+
+
+def _run_in_thread(request_id: int):
+    try:
+        run_matching(request_id)
+    except Exception:
+        logger.exception("Background matching failed for request %s", request_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_matching(req: RideRequest) -> None:
+    """
+    Hand matching for `req` to the configured RIDE_DISPATCH_BACKEND:
+    "inline" runs it now, "thread" on an in-process pool after commit, and
+    "database" queues a DispatchTask for `manage.py run_dispatch_worker`. The
+    in-process backends also start the process' wave timer, as no worker fires
+    their later waves.
+    Under the "batch" RIDE_MATCHING_STRATEGY nothing is queued: the worker's next
+    batch tick picks the request up.
+    """
+    global _executor
+    if getattr(settings, "RIDE_MATCHING_STRATEGY", STRATEGY_WAVES) == STRATEGY_BATCH:
+        return
+    backend = getattr(settings, "RIDE_DISPATCH_BACKEND", BACKEND_DATABASE)
+    if wave_timer_wanted():
+        ensure_wave_timer()
+    if backend == BACKEND_DATABASE:
+        DispatchTask.objects.get_or_create(request=req)
+    elif backend == BACKEND_THREAD:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, "RIDE_DISPATCH_THREADS", 2),
+                                           thread_name_prefix="ride-dispatch")
+        pk = req.pk
+        transaction.on_commit(lambda: _executor.submit(_run_in_thread, pk))
+    else:
+        run_matching(req.pk)
+
+
+# ---- Database queue ----
+
+def claim_tasks(worker_id: str, batch_size: int = 20) -> List[DispatchTask]:
+    """
+    Claim up to `batch_size` queued tasks (or running ones whose lease expired).
+    Each claim is a conditional UPDATE, so concurrent workers never share a task.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "RIDE_DISPATCH_LEASE_SECONDS", 60))
+    claimable = Q(status=DispatchTaskStatus.QUEUED) | Q(status=DispatchTaskStatus.RUNNING, claimed_at__lt=now - lease)
+    candidates = list(
+        DispatchTask.objects.filter(claimable).order_by("created_at").values_list("pk", "status", "claimed_at")[:batch_size]
+    )
+    claimed = []
+    for pk, status, claimed_at in candidates:
+        won = DispatchTask.objects.filter(pk=pk, status=status, claimed_at=claimed_at).update(
+            status=DispatchTaskStatus.RUNNING, claimed_by=worker_id, claimed_at=now, attempts=F("attempts") + 1,
+        )
+        if won:
+            claimed.append(pk)
+    return list(DispatchTask.objects.filter(pk__in=claimed).order_by("created_at"))
+
+
+def run_task(task: DispatchTask) -> bool:
+    max_attempts = getattr(settings, "RIDE_DISPATCH_MAX_ATTEMPTS", 3)
+    mine = DispatchTask.objects.filter(pk=task.pk, claimed_by=task.claimed_by, status=DispatchTaskStatus.RUNNING)
+    try:
+        run_matching(task.request_id)
+    except Exception as e:
+        logger.exception("Dispatch task %s failed", task.pk)
+        failed = task.attempts >= max_attempts
+        mine.update(
+            status=DispatchTaskStatus.FAILED if failed else DispatchTaskStatus.QUEUED,
+            last_error=str(e)[:2000],
+            finished_at=timezone.now() if failed else None,
+        )
+        return False
+    mine.update(status=DispatchTaskStatus.DONE, finished_at=timezone.now(), last_error="")
+    return True
+
+
+def process_queue(worker_id: str, batch_size: int = 20) -> int:
+    """
+    One worker pass: claim a batch and run it. Returns the number of tasks claimed.
+    """
+    tasks = claim_tasks(worker_id, batch_size)
+    if tasks:
+        refresh_driver_index()
+    for task in tasks:
+        run_task(task)
+    return len(tasks)
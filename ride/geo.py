@@ -0,0 +1,197 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from math import radians, sin, cos, asin, sqrt, floor
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback for the batch kernels below
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return EARTH_RADIUS_KM * c
+
+
+# ---- Batch kernels ----
+
+def _broadcast(*cols):
+    n = max((len(c) for c in cols if isinstance(c, (list, tuple))), default=1)
+    return [c if isinstance(c, (list, tuple)) else [c] * n for c in cols]
+
+def haversine_km_batch(lat1, lng1, lat2, lng2):
+    """
+    Elementwise haversine over sequences of coordinates (scalars broadcast).
+    Returns a NumPy array when NumPy is installed, a list otherwise.
+    """
+    if np is not None:
+        lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lng1, lat2, lng2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    cols = _broadcast(*(list(map(float, x)) if isinstance(x, Sequence) else float(x) for x in (lat1, lng1, lat2, lng2)))
+    return [haversine_km(*row) for row in zip(*cols)]
+
+def eta_min_batch(distances_km, avg_speed_kmh: float = 24.0):
+    """
+    Whole-minute ETAs (at least 1) for a batch of distances, like `_estimate_eta_min`.
+    """
+    if avg_speed_kmh <= 0:
+        return np.zeros(len(distances_km), dtype=int) if np is not None else [0] * len(distances_km)
+    if np is not None:
+        return np.maximum(1, np.rint(np.asarray(distances_km, dtype=float) / avg_speed_kmh * 60.0)).astype(int)
+    return [max(1, int(round(d / avg_speed_kmh * 60.0))) for d in distances_km]
+
+def select_nearest(distances_km, max_km: float, k: int) -> List[int]:
+    """
+    Positions of the `k` smallest distances not exceeding `max_km`, nearest first.
+    """
+    if k <= 0:
+        return []
+    if np is not None:
+        dists = np.asarray(distances_km, dtype=float)
+        idx = np.flatnonzero(dists <= max_km)
+        if len(idx) > k:
+            idx = idx[np.argpartition(dists[idx], k - 1)[:k]]
+        return idx[np.argsort(dists[idx], kind="stable")].tolist()
+    inside = [i for i, d in enumerate(distances_km) if d <= max_km]
+    return sorted(inside, key=lambda i: distances_km[i])[:k]
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, max_lat, min_lng, max_lng) enclosing the circle of `radius_km` around (lat, lng).
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    coslat = max(cos(radians(lat)), 1e-6)
+    dlng = min(radius_km / (KM_PER_DEG_LAT * coslat), 180.0)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+# ---- Driver grid index ----
+
+@dataclass(frozen=True)
+class IndexedDriver:
+    driver_id: int
+    lat: float
+    lng: float
+    vehicle_id: Optional[int] = None
+
+
+class DriverGridIndex:
+    """
+    Uniform lat/lng grid of available drivers. Each driver lives in exactly one cell,
+    so radius and k-nearest lookups only visit the cells overlapping the search box.
+    """
+
+    def __init__(self, cell_deg: float = 0.02):
+        self.cell_deg = float(cell_deg)
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._drivers: Dict[int, IndexedDriver] = {}
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._drivers
+
+    def cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        return floor(lat / self.cell_deg), floor(lng / self.cell_deg)
+
+    def get(self, driver_id: int) -> Optional[IndexedDriver]:
+        return self._drivers.get(driver_id)
+
+    def upsert(self, driver_id: int, lat: float, lng: float, vehicle_id: Optional[int] = None) -> None:
+        entry = IndexedDriver(driver_id, float(lat), float(lng), vehicle_id)
+        cell = self.cell_of(entry.lat, entry.lng)
+        with self._lock:
+            prev = self._drivers.get(driver_id)
+            if prev is not None:
+                prev_cell = self.cell_of(prev.lat, prev.lng)
+                if prev_cell != cell:
+                    self._discard_from_cell(prev_cell, driver_id)
+            self._drivers[driver_id] = entry
+            self._cells.setdefault(cell, set()).add(driver_id)
+
+    def remove(self, driver_id: int) -> None:
+        with self._lock:
+            prev = self._drivers.pop(driver_id, None)
+            if prev is not None:
+                self._discard_from_cell(self.cell_of(prev.lat, prev.lng), driver_id)
+
+    def replace_all(self, entries: Iterable[IndexedDriver]) -> None:
+        cells: Dict[Tuple[int, int], Set[int]] = {}
+        drivers: Dict[int, IndexedDriver] = {}
+        for e in entries:
+            drivers[e.driver_id] = e
+            cells.setdefault(self.cell_of(e.lat, e.lng), set()).add(e.driver_id)
+        with self._lock:
+            self._cells = cells
+            self._drivers = drivers
+
+    def _discard_from_cell(self, cell, driver_id):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(driver_id)
+            if not bucket:
+                del self._cells[cell]
+
+    def _candidates_in_box(self, lat: float, lng: float, radius_km: float) -> List[IndexedDriver]:
+        return self.in_box(*bounding_box(lat, lng, radius_km))
+
+    def in_box(self, min_lat: float, max_lat: float, min_lng: float, max_lng: float) -> List[IndexedDriver]:
+        """
+        Every indexed driver in the cells overlapping the box (may include a few just outside it).
+        """
+        r0, c0 = self.cell_of(min_lat, min_lng)
+        r1, c1 = self.cell_of(max_lat, max_lng)
+        out: List[IndexedDriver] = []
+        with self._lock:
+            # sparse grids: walking the occupied cells is cheaper than walking the box
+            if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._cells):
+                for (r, c), ids in self._cells.items():
+                    if r0 <= r <= r1 and c0 <= c <= c1:
+                        out.extend(self._drivers[i] for i in ids)
+                return out
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    ids = self._cells.get((r, c))
+                    if ids:
+                        out.extend(self._drivers[i] for i in ids)
+        return out
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, IndexedDriver]]:
+        """
+        [(distance_km, driver)] for every indexed driver within `radius_km`, nearest first.
+        """
+        return self._nearest_in_box(lat, lng, radius_km, k=len(self._drivers))
+
+    def _nearest_in_box(self, lat, lng, radius_km, k):
+        entries = self._candidates_in_box(lat, lng, radius_km)
+        if not entries:
+            return []
+        dists = haversine_km_batch(lat, lng, [e.lat for e in entries], [e.lng for e in entries])
+        return [(float(dists[i]), entries[i]) for i in select_nearest(dists, radius_km, k)]
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_km: float) -> List[Tuple[float, IndexedDriver]]:
+        """
+        Up to `k` nearest drivers within `max_radius_km`. The search radius starts at one
+        cell and doubles until k drivers are found, so dense areas never scan far.
+        """
+        if k <= 0:
+            return []
+        radius = min(self.cell_deg * KM_PER_DEG_LAT, max_radius_km)
+        while True:
+            hits = self._nearest_in_box(lat, lng, radius, k)
+            if len(hits) >= k or radius >= max_radius_km:
+                return hits
+            radius = min(radius * 2, max_radius_km)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LocationPing:
+    driver_id: int
+    lat: Decimal
+    lng: Decimal
+    recorded_at: datetime
+
+
+class LocationBuffer:
+    """
+    Write-behind buffer for driver pings. Only the latest ping per driver is kept,
+    and a background thread writes them out with one bulk UPDATE per interval.
+
+    The newest accepted ping per driver is remembered across flushes, so a late,
+    older ping never overwrites a newer position; pings stamped more than
+    `max_future_skew` seconds ahead of the server clock are rejected.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_pending: int = 5000, batch_size: int = 500,
+                 max_future_skew: float = 30.0):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.max_future_skew = timedelta(seconds=max_future_skew)
+        self._pending: Dict[int, LocationPing] = {}
+        self._latest: Dict[int, LocationPing] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def latest(self, driver_id: int) -> Optional[LocationPing]:
+        """
+        The newest ping accepted for the driver, whether or not it was flushed yet.
+        """
+        return self._latest.get(driver_id)
+
+    def snapshot(self) -> Dict[int, LocationPing]:
+        with self._lock:
+            return dict(self._pending)
+
+    def push(self, pings: Iterable[LocationPing]) -> int:
+        accepted = 0
+        horizon = timezone.now() + self.max_future_skew
+        with self._lock:
+            for p in pings:
+                if p.recorded_at > horizon:
+                    continue
+                prev = self._latest.get(p.driver_id)
+                if prev is not None and prev.recorded_at > p.recorded_at:
+                    continue
+                self._pending[p.driver_id] = self._latest[p.driver_id] = p
+                accepted += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+        else:
+            self._ensure_worker()
+        return accepted
+
+    def flush(self) -> int:
+        """
+        Write every buffered position; returns the number of drivers updated.
+        If the write fails the positions go back into the buffer (unless a newer
+        ping arrived meanwhile) and the error is re-raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            Driver = apps.get_model("profiles", "Driver")
+            rows = [Driver(pk=p.driver_id, current_lat=p.lat, current_lng=p.lng) for p in pending.values()]
+            try:
+                Driver.objects.bulk_update(rows, ["current_lat", "current_lng"], batch_size=self.batch_size)
+            except Exception:
+                with self._lock:
+                    for pk, p in pending.items():
+                        newer = self._pending.get(pk)
+                        if newer is None or newer.recorded_at < p.recorded_at:
+                            self._pending[pk] = p
+                raise
+            return len(rows)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="driver-location-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Driver location flush failed")
+            finally:
+                close_old_connections()
+
+
+location_buffer = LocationBuffer(
+    flush_interval=getattr(settings, "RIDE_LOCATION_FLUSH_SECONDS", 5.0),
+    max_pending=getattr(settings, "RIDE_LOCATION_MAX_PENDING", 5000),
+    max_future_skew=getattr(settings, "RIDE_LOCATION_MAX_FUTURE_SKEW_SECONDS", 30),
+)
+atexit.register(location_buffer.flush)
@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ride import assignment
+from ride.assignment import INFEASIBLE, pairwise_distance_km, solve_assignment
+from ride.travel import DEFAULT_PICKUP_SPEED_KMH
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the batched matcher on synthetic requests and drivers scattered around a city: "
+        "cost-matrix build and min-cost assignment, reported separately. No database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--drivers", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--spread-km", type=float, default=15.0, help="Half-width of the square everyone is placed in.")
+        parser.add_argument("--max-radius-km", type=float, default=8.0)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        lat0, lng0 = 6.5244, 3.3792
+        spread = opts["spread_km"] / 111.0
+
+        def points(n):
+            return ([lat0 + rnd.uniform(-spread, spread) for _ in range(n)],
+                    [lng0 + rnd.uniform(-spread, spread) for _ in range(n)])
+
+        req_lats, req_lngs = points(opts["requests"])
+        drv_lats, drv_lngs = points(opts["drivers"])
+        solver = "scipy" if assignment.linear_sum_assignment is not None else "numpy hungarian"
+        self.stdout.write(f"{opts['requests']} requests x {opts['drivers']} drivers, solver: {solver}")
+
+        build_ms, solve_ms, assigned = [], [], 0
+        for _ in range(opts["repeat"]):
+            t0 = time.perf_counter()
+            dist = pairwise_distance_km(req_lats, req_lngs, drv_lats, drv_lngs)
+            cost = dist / DEFAULT_PICKUP_SPEED_KMH * 60.0
+            cost[dist > opts["max_radius_km"]] = INFEASIBLE
+            t1 = time.perf_counter()
+            rows, cols = solve_assignment(cost)
+            t2 = time.perf_counter()
+            build_ms.append((t1 - t0) * 1000.0)
+            solve_ms.append((t2 - t1) * 1000.0)
+            assigned = int((cost[rows, cols] < INFEASIBLE).sum())
+
+        self.stdout.write(f"  cost matrix: median {statistics.median(build_ms):.1f} ms")
+        self.stdout.write(f"  assignment:  median {statistics.median(solve_ms):.1f} ms")
+        self.stdout.write(f"  total:       median {statistics.median(b + s for b, s in zip(build_ms, solve_ms)):.1f} ms")
+        self.stdout.write(f"  pairs matched within {opts['max_radius_km']:g} km: {assigned}")
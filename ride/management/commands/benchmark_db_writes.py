@@ -0,0 +1,218 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from ride import services
+from ride.models import PaymentMethod, Ride, RideRequestMatch
+
+from .loadtest import percentile
+
+STEPS = ("create", "accept", "start", "complete")
+
+
+class Command(BaseCommand):
+    help = (
+        "Write-throughput benchmark for the database profiles: concurrent drivers run the "
+        "project's ride lifecycle (create_ride_request with inline matching, accept_match, "
+        "start_ride, complete_ride) against a fresh database for each DJANGO_DB_PROFILE and "
+        "report completed rides per second and lock errors. A failed step is retried, as a "
+        "client would; the connection is released between steps as at the end of a request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default="development,production")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent driver/rider pairs, one thread each.")
+        parser.add_argument("--duration", type=float, default=15.0, help="Seconds per profile.")
+        parser.add_argument("--keep", action="store_true", help="Keep the scratch databases and print their paths.")
+        parser.add_argument("--child", action="store_true", help="Internal: run one profile in this process.")
+
+    def handle(self, *args, **opts):
+        if opts["child"]:
+            self.stdout.write(json.dumps(self.run_profile(opts["workers"], opts["duration"])))
+            return
+        results = [self.spawn(profile.strip(), opts) for profile in opts["profiles"].split(",") if profile.strip()]
+        self.report(results)
+
+    # -- parent: one subprocess per profile, each on a fresh database --
+
+    def spawn(self, profile, opts):
+        scratch = Path(tempfile.mkdtemp(prefix=f"db-bench-{profile}-"))
+        env = dict(os.environ, DJANGO_DB_PROFILE=profile, DJANGO_DB_NAME=str(scratch / "db.sqlite3"))
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / "manage.py")]
+        self.stdout.write(f"{profile}: migrating {env['DJANGO_DB_NAME']}")
+        subprocess.run(manage + ["migrate", "--noinput", "-v0"], env=env, check=True)
+        self.stdout.write(f"{profile}: {opts['workers']} worker(s) for {opts['duration']:g} s")
+        out = subprocess.run(manage + ["benchmark_db_writes", "--child", "--workers", str(opts["workers"]),
+                                       "--duration", str(opts["duration"])],
+                             env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if result["database"] != env["DJANGO_DB_NAME"]:
+            raise CommandError(f"{os.environ.get('DJANGO_SETTINGS_MODULE')} ignores DJANGO_DB_NAME "
+                               f"(ran against {result['database']}); use config.settings.")
+        if opts["keep"]:
+            self.stdout.write(f"  kept {scratch}")
+        else:
+            for path in scratch.iterdir():
+                path.unlink()
+            scratch.rmdir()
+        return result
+
+    def report(self, results):
+        header = (f"{'profile':<13}{'rides':>7}{'rides/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'locked':>8}{'other':>7}  pragmas")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for r in results:
+            errors = Counter()
+            for step in r["errors"].values():
+                errors.update(step)
+            other = sum(n for kind, n in errors.items() if kind != "locked")
+            self.stdout.write(
+                f"{r['profile']:<13}{r['rides']:>7}{r['rides_per_s']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                f"{r['p99_ms']:>9.1f}{errors['locked']:>8}{other:>7}  "
+                + ", ".join(f"{k}={v}" for k, v in r["pragmas"].items())
+            )
+            for step in STEPS:
+                if r["errors"].get(step):
+                    self.stdout.write(f"  {step}: " + ", ".join(f"{k}x{n}" for k, n in sorted(r["errors"][step].items())))
+        if len(results) > 1 and results[0]["rides_per_s"]:
+            base = results[0]
+            for r in results[1:]:
+                self.stdout.write(f"{r['profile']} vs {base['profile']}: "
+                                  f"{r['rides_per_s'] / base['rides_per_s']:.2f}x rides/s")
+
+    # -- child: the actual load --
+
+    def run_profile(self, workers, duration):
+        pairs = self.seed(workers)
+        services.load_driver_index()
+        latencies, errors, lock = [], defaultdict(Counter), threading.Lock()
+        deadline = None
+
+        def worker(driver, customer, lat, lng):
+            local_latencies, local_errors = [], defaultdict(Counter)
+            try:
+                while time.monotonic() < deadline:
+                    t0 = time.perf_counter()
+                    if self.lifecycle(driver, customer, lat, lng, local_errors, deadline):
+                        local_latencies.append((time.perf_counter() - t0) * 1000.0)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(local_latencies)
+                    for step, counts in local_errors.items():
+                        errors[step].update(counts)
+
+        threads = [threading.Thread(target=worker, args=pair, name=f"db-bench-{i}") for i, pair in enumerate(pairs)]
+        with override_settings(RIDE_DISPATCH_BACKEND="inline"):
+            deadline = time.monotonic() + duration
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+
+        latencies.sort()
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+        return {
+            "profile": settings.DB_PROFILE,
+            "database": str(settings.DATABASES["default"]["NAME"]),
+            "conn_max_age": settings.DATABASES["default"].get("CONN_MAX_AGE", 0),
+            "pragmas": pragmas,
+            "workers": workers,
+            "elapsed_s": elapsed,
+            "rides": len(latencies),
+            "rides_per_s": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "errors": {step: dict(counts) for step, counts in errors.items()},
+        }
+
+    def seed(self, workers):
+        User = apps.get_model("profiles", "CustomUser")
+        Driver = apps.get_model("profiles", "Driver")
+        Customer = apps.get_model("profiles", "Customer")
+        tag = uuid.uuid4().hex[:8]
+        pairs = []
+        for i in range(workers):
+            # a degree of latitude apart: each rider only ever matches its own driver
+            lat, lng = Decimal("6.524400") + i, Decimal("3.379200")
+            d = User.objects.create_user(username=f"dbbench-{tag}-d{i}", phone_number="0",
+                                         email=f"dbbench-{tag}-d{i}@example.com", password=None)
+            c = User.objects.create_user(username=f"dbbench-{tag}-c{i}", phone_number="0",
+                                         email=f"dbbench-{tag}-c{i}@example.com", password=None)
+            Customer.objects.create(user=c)
+            driver = Driver.objects.create(user=d, is_available=True, current_lat=lat, current_lng=lng)
+            pairs.append((driver, c, lat, lng))
+        return pairs
+
+    def lifecycle(self, driver, customer, lat, lng, errors, deadline) -> bool:
+        """
+        One ride from request to completion; each step is retried until it succeeds
+        or the run ends. True when the ride was completed.
+        """
+        state = {}
+
+        def create():
+            state["request"] = services.create_ride_request(
+                customer, pickup_address="Bench pickup", dropoff_address="Bench dropoff",
+                pickup_lat=lat + Decimal("0.002"), pickup_lng=lng, dropoff_lat=lat + Decimal("0.05"),
+                dropoff_lng=lng + Decimal("0.03"), payment_method=PaymentMethod.CASH,
+            ).request
+
+        def accept():
+            match = RideRequestMatch.objects.select_related("driver", "request").filter(
+                request=state["request"], driver=driver).first()
+            if match is None:
+                raise LookupError("not matched")
+            state["ride"] = services.accept_match(match, driver.user)
+
+        # each attempt loads the ride afresh, as a request would: a failed save leaves
+        # the previous instance half-updated
+        def start():
+            services.start_ride(Ride.objects.select_related("driver").get(pk=state["ride"].pk), driver.user)
+
+        def complete():
+            services.complete_ride(Ride.objects.select_related("driver").get(pk=state["ride"].pk), driver.user,
+                                   end_lat=lat, end_lng=lng)
+
+        for step, fn in zip(STEPS, (create, accept, start, complete)):
+            while True:
+                if time.monotonic() >= deadline:
+                    return False
+                try:
+                    fn()
+                    break
+                except DatabaseError as e:
+                    errors[step]["locked" if "locked" in str(e) else type(e).__name__] += 1
+                except LookupError:
+                    errors[step]["unmatched"] += 1
+                    return False
+                except (ValidationError, PermissionDenied) as e:
+                    errors[step][type(e).__name__] += 1
+                    return False
+                finally:
+                    # what the end of a request does: closes it unless CONN_MAX_AGE keeps it
+                    close_old_connections()
+        return True
@@ -0,0 +1,231 @@
+import json
+import platform
+import random
+import statistics
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ride import services
+from ride.geo import IndexedDriver
+from ride.models import PaymentMethod, PricingConfig, PricingMode, RideRequest, RideRequestStatus
+
+LAGOS = (6.5244, 3.3792)
+
+TARIFF_MIXES = {
+    # one default tariff, as in a fresh install
+    "single": [("Standard", "250.00", "120.00", "10.00", "600.00", "1.00")],
+    # a typical city: several products, some surging
+    "city": [
+        ("Standard", "250.00", "120.00", "10.00", "600.00", "1.00"),
+        ("XL", "400.00", "180.00", "15.00", "900.00", "1.30"),
+        ("Bike", "100.00", "60.00", "5.00", "300.00", "1.00"),
+        ("Lux", "800.00", "300.00", "25.00", "2000.00", "1.80"),
+    ],
+}
+
+
+def _tariffs(mix):
+    return [
+        PricingConfig(city="Lagos", vehicle_type=vt, mode=PricingMode.METERED, base_fare=Decimal(base),
+                      per_km=Decimal(km), per_min=Decimal(mins), booking_fee=Decimal("100.00"),
+                      min_fare=Decimal(minimum), surge_multiplier=Decimal(surge), commission_pct=Decimal("15.00"))
+        for vt, base, km, mins, minimum, surge in TARIFF_MIXES[mix]
+    ]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks for the ride.services hot paths (haversine_km, metered_quote, "
+        "find_nearby_drivers, build_matches_for_request, compute_request_estimates) over "
+        "driver counts and tariff mixes. --save records a baseline; later runs compare "
+        "against it and exit non-zero when any benchmark slows down by more than --threshold. "
+        "Database work runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,10000,100000", help="Comma-separated driver counts.")
+        parser.add_argument("--only", default="", help="Run only benchmarks whose name contains this text.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per benchmark; the median is kept.")
+        parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round.")
+        parser.add_argument("--baseline", default=None,
+                            help="Baseline file (default: RIDE_BENCHMARK_BASELINE or benchmarks/ride_services.json).")
+        parser.add_argument("--save", action="store_true", help="Write the results as the new baseline.")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Allowed slowdown against the baseline, as a fraction (0.25 = 25%%).")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        self.opts = opts
+        self.rnd = random.Random(opts["seed"])
+        sizes = [int(s) for s in opts["sizes"].split(",") if s.strip()]
+        results = {}
+        try:
+            with transaction.atomic(), override_settings(RIDE_DRIVER_INDEX_REFRESH_SECONDS=0,
+                                                         RIDE_DRIVER_INDEX_ENABLED=True):
+                self.customer = self.make_customer()
+                for name, setup in self.benchmarks(sizes):
+                    if opts["only"] and opts["only"] not in name:
+                        continue
+                    results[name] = self.measure(setup())
+                    self.stdout.write(f"{name:<48}{results[name]:>14.2f} us/call")
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            services.load_driver_index()
+            services.tariff_cache.invalidate()
+
+        path = Path(opts["baseline"] or getattr(settings, "RIDE_BENCHMARK_BASELINE",
+                                                 Path(settings.BASE_DIR) / "benchmarks" / "ride_services.json"))
+        if opts["save"]:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                "saved_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results_us": results,
+            }, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Saved {len(results)} result(s) to {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(f"No baseline at {path}; run with --save to create one.")
+            return
+        self.compare(results, json.loads(path.read_text()).get("results_us", {}), path)
+
+    # -- harness --
+
+    def measure(self, fn) -> float:
+        """
+        Median microseconds per call over `repeat` rounds of at least `min_time` seconds.
+        """
+        fn()  # warm-up (imports, caches)
+        number, elapsed = 1, 0.0
+        while True:
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - t0
+            if elapsed >= self.opts["min_time"]:
+                break
+            number *= 2 if elapsed <= 0 else max(2, min(10, int(self.opts["min_time"] / elapsed) + 1))
+        rounds = [elapsed / number]
+        for _ in range(self.opts["repeat"] - 1):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            rounds.append((time.perf_counter() - t0) / number)
+        return statistics.median(rounds) * 1e6
+
+    def compare(self, results, baseline, path):
+        threshold = self.opts["threshold"]
+        regressions = []
+        self.stdout.write(f"\nAgainst {path} (threshold +{threshold:.0%}):")
+        for name, now in results.items():
+            before = baseline.get(name)
+            if not before:
+                self.stdout.write(f"  {name:<46} new")
+                continue
+            change = now / before - 1.0
+            flag = ""
+            if change > threshold:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            self.stdout.write(f"  {name:<46}{before:>12.2f} -> {now:>12.2f} us ({change:+.1%}){flag}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed by more than {threshold:.0%}: "
+                               + ", ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    # -- fixtures --
+
+    def point(self, spread_km=10.0):
+        spread = spread_km / 111.0
+        return LAGOS[0] + self.rnd.uniform(-spread, spread), LAGOS[1] + self.rnd.uniform(-spread, spread)
+
+    def make_customer(self):
+        from django.apps import apps
+        User = apps.get_model("profiles", "CustomUser")
+        return User.objects.create_user(username="benchmark-customer", phone_number="0",
+                                        email="benchmark-customer@example.com", password=None)
+
+    def make_requests(self, n):
+        # bulk_create skips the creation pipeline (estimates, dispatch)
+        pickup = Decimal(str(LAGOS[0])), Decimal(str(LAGOS[1]))
+        RideRequest.objects.bulk_create([
+            RideRequest(customer=self.customer, pickup_address="Bench", dropoff_address="Bench",
+                        pickup_lat=pickup[0], pickup_lng=pickup[1],
+                        dropoff_lat=Decimal("6.600000"), dropoff_lng=Decimal("3.400000"),
+                        payment_method=PaymentMethod.CASH, status=RideRequestStatus.OPEN)
+            for _ in range(n)
+        ], batch_size=500)
+        return iter(RideRequest.objects.filter(customer=self.customer).order_by("-pk")[:n])
+
+    def fill_index(self, n):
+        # driver ids far above any real ones; matches pointing at them are rolled back
+        rnd = random.Random(n)
+        spread = 10.0 / 111.0
+        entries = [IndexedDriver(10_000_000 + i, LAGOS[0] + rnd.uniform(-spread, spread),
+                                 LAGOS[1] + rnd.uniform(-spread, spread), None) for i in range(n)]
+        services.get_driver_index().replace_all(entries)
+        return entries
+
+    # -- benchmarks --
+
+    def benchmarks(self, sizes):
+        """
+        (name, setup) pairs; `setup()` builds the fixture and returns the timed callable,
+        so filtered-out benchmarks cost nothing.
+        """
+        lat, lng = LAGOS
+        dlat, dlng = self.point()
+        yield "haversine_km", lambda: (lambda: services.haversine_km(lat, lng, dlat, dlng))
+
+        dist, dur = Decimal("11.34"), Decimal("31")
+        for mix in TARIFF_MIXES:
+            tariffs = _tariffs(mix)
+            yield f"metered_quote[{mix}]", lambda t=tariffs: (
+                lambda: [services.metered_quote(dist, dur, c) for c in t])
+            yield f"metered_quote[{mix},live-surge]", lambda t=tariffs: (
+                lambda: [services.metered_quote(dist, dur, c, surge=Decimal("1.40")) for c in t])
+
+        def nearby_index(n):
+            self.fill_index(n)
+            return lambda: services.find_nearby_drivers(None, lat, lng, 8.0, 5)
+
+        def nearby_scan(n):
+            drivers = [SimpleNamespace(id=e.driver_id, is_available=True, current_lat=e.lat, current_lng=e.lng,
+                                       vehicle_id=None) for e in self.fill_index(n)]
+            return lambda: services.find_nearby_drivers(drivers, lat, lng, 8.0, 5)
+
+        def build_matches(n):
+            self.fill_index(n)
+            # enough fresh requests for warm-up, calibration and every round
+            requests = self.make_requests(2000)
+            return lambda: services.build_matches_for_request(next(requests))
+
+        for n in sizes:
+            yield f"find_nearby_drivers[index,{n}]", lambda n=n: nearby_index(n)
+            yield f"find_nearby_drivers[scan,{n}]", lambda n=n: nearby_scan(n)
+            yield f"build_matches_for_request[index,{n}]", lambda n=n: build_matches(n)
+
+        def estimates(mix):
+            PricingConfig.objects.filter(city__iexact="Lagos").delete()
+            PricingConfig.objects.bulk_create(_tariffs(mix))
+            services.tariff_cache.invalidate()
+            requests = self.make_requests(2000)
+            return lambda: services.compute_request_estimates(next(requests))
+
+        for mix in TARIFF_MIXES:
+            yield f"compute_request_estimates[{mix}]", lambda m=mix: estimates(m)
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ride.travel import build_speed_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the TravelSpeed table (average speed per zone and hour of week) from "
+        "completed rides. Web and worker processes pick it up on their next restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="Only use rides that ended in the last N days (0 = all).")
+        parser.add_argument("--min-kmh", type=float, default=3.0)
+        parser.add_argument("--max-kmh", type=float, default=120.0)
+
+    def handle(self, *args, **opts):
+        since = timezone.now() - timedelta(days=opts["days"]) if opts["days"] else None
+        used, rows = build_speed_table(since=since, min_kmh=opts["min_kmh"], max_kmh=opts["max_kmh"])
+        self.stdout.write(self.style.SUCCESS(f"Built {rows} speed bucket(s) from {used} completed ride(s)"))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ride.services import expire_stale
+
+
+class Command(BaseCommand):
+    help = "Expire stale open ride requests and unanswered driver matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per UPDATE (default: RIDE_EXPIRY_BATCH_SIZE).")
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=30.0)
+
+    def handle(self, *args, **opts):
+        try:
+            while True:
+                result = expire_stale(batch_size=opts["batch_size"])
+                self.stdout.write(
+                    f"Expired {result.requests} request(s) and {result.matches} match(es) in {result.elapsed_ms:.1f} ms"
+                )
+                close_old_connections()
+                if not opts["loop"]:
+                    break
+                time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            pass
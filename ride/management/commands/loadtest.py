@@ -0,0 +1,292 @@
+import base64
+import json
+import logging
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+LAGOS = (6.5244, 3.3792)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """
+    Status counts for every call, latencies for successful (2xx) ones only, so
+    rejected and failed requests do not pass for served traffic. Status 0 means
+    no response (the transport raised).
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, status: int, ms: float) -> None:
+        with self.lock:
+            if 200 <= status < 300:
+                self.latencies[endpoint].append(ms)
+            self.statuses[endpoint][status] += 1
+
+
+class InProcessTransport:
+    """
+    Requests through Django's test client in this process (session login, no network).
+    """
+
+    def __init__(self, user):
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(user)
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, object]:
+        if method == "GET":
+            resp = self.client.get(path)
+        else:
+            resp = self.client.post(path, json.dumps(body or {}), content_type="application/json")
+        try:
+            data = json.loads(resp.content or b"null")
+        except ValueError:
+            data = None
+        return resp.status_code, data
+
+
+class HttpTransport:
+    """
+    Real HTTP against a running server with Basic auth (so every request also pays
+    for the server-side password check).
+    """
+
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url.rstrip("/")
+        token = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}", "Content-Type": "application/json",
+                        "Accept": "application/json"}
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, object]:
+        data = json.dumps(body or {}).encode() if method != "GET" else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=self.headers)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                status, raw = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            return status, json.loads(raw or b"null")
+        except ValueError:
+            return status, None
+
+
+class Command(BaseCommand):
+    help = (
+        "End-to-end load test: seeds drivers and customers, then drives the ride API "
+        "concurrently (riders quote, request, wait and cancel if unmatched; drivers accept, "
+        "start and complete) and reports throughput and p50/p95/p99 latency per endpoint. "
+        "Runs in-process by default; with --url it sends real HTTP to a server that uses "
+        "this project's database (SQLite or Postgres)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=10)
+        parser.add_argument("--customers", type=int, default=10)
+        parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run the load.")
+        parser.add_argument("--url", default=None, help="Base URL of a running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--spread-km", type=float, default=3.0, help="Half-width of the area pickups and drivers are placed in.")
+        parser.add_argument("--match-timeout", type=float, default=10.0, help="Seconds a rider waits for a driver before cancelling.")
+        parser.add_argument("--poll-interval", type=float, default=0.2)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--keep", action="store_true", help="Leave the seeded users and their rides in the database.")
+        parser.add_argument("--max-error-ratio", type=float, default=0.5,
+                            help="Fail when more than this share of all calls is not 2xx.")
+
+    def handle(self, *args, **opts):
+        if opts["drivers"] < 1 or opts["customers"] < 1:
+            raise CommandError("Need at least one driver and one customer.")
+        self.rnd = random.Random(opts["seed"])
+        self.opts = opts
+        self.password = uuid.uuid4().hex
+        tag = uuid.uuid4().hex[:8]
+        drivers, customers = self.seed(tag)
+        try:
+            if opts["url"]:
+                recorder, elapsed = self.run(drivers, customers)
+            else:
+                # no separate dispatch worker in-process: match inline, which also
+                # starts the process' wave timer. The test client sends Host "testserver". Django
+                # logs every 4xx/5xx, which would drown the report
+                with override_settings(RIDE_DISPATCH_BACKEND="inline", ALLOWED_HOSTS=["testserver"]):
+                    request_logger = logging.getLogger("django.request")
+                    level = request_logger.level
+                    request_logger.setLevel(logging.CRITICAL)
+                    try:
+                        recorder, elapsed = self.run(drivers, customers)
+                    finally:
+                        request_logger.setLevel(level)
+            self.report(recorder, elapsed)
+        finally:
+            if not opts["keep"]:
+                for user in drivers + customers:
+                    user.delete()
+
+    # -- setup --
+
+    def point(self) -> Tuple[Decimal, Decimal]:
+        spread = self.opts["spread_km"] / 111.0
+        return (Decimal(str(round(LAGOS[0] + self.rnd.uniform(-spread, spread), 6))),
+                Decimal(str(round(LAGOS[1] + self.rnd.uniform(-spread, spread), 6))))
+
+    def seed(self, tag):
+        User = apps.get_model("profiles", "CustomUser")
+        Driver = apps.get_model("profiles", "Driver")
+        Customer = apps.get_model("profiles", "Customer")
+
+        def user(name):
+            return User.objects.create_user(
+                username=f"load-{tag}-{name}", phone_number="0", email=f"load-{tag}-{name}@example.com",
+                password=self.password, first_name="Load", last_name=name,
+            )
+
+        drivers, customers = [], []
+        for i in range(self.opts["drivers"]):
+            u = user(f"driver{i}")
+            lat, lng = self.point()
+            Driver.objects.create(user=u, is_available=True, current_lat=lat, current_lng=lng)
+            drivers.append(u)
+        for i in range(self.opts["customers"]):
+            u = user(f"customer{i}")
+            Customer.objects.create(user=u)
+            customers.append(u)
+        self.stdout.write(f"Seeded {len(drivers)} driver(s) and {len(customers)} customer(s)")
+        return drivers, customers
+
+    def transport(self, user):
+        if self.opts["url"]:
+            return HttpTransport(self.opts["url"], user.username, self.password)
+        return InProcessTransport(user)
+
+    # -- simulated users --
+
+    def call(self, recorder, transport, endpoint, method, path, body=None):
+        t0 = time.perf_counter()
+        try:
+            status, data = transport.request(method, path, body)
+        except Exception:
+            status, data = 0, None
+        recorder.add(endpoint, status, (time.perf_counter() - t0) * 1000.0)
+        return status, data
+
+    def rider(self, t, recorder, deadline):
+        while time.monotonic() < deadline:
+            (plat, plng), (dlat, dlng) = self.point(), self.point()
+            trip = {"pickup_lat": str(plat), "pickup_lng": str(plng), "dropoff_lat": str(dlat), "dropoff_lng": str(dlng)}
+            self.call(recorder, t, "ride-requests:quote", "POST", "/api/ride-requests/quote/",
+                      dict(trip, city="Lagos", vehicle_type="Standard"))
+            status, data = self.call(recorder, t, "ride-requests:create", "POST", "/api/ride-requests/",
+                                     dict(trip, pickup_address="Load pickup", dropoff_address="Load dropoff",
+                                          payment_method="CASH", city="Lagos", vehicle_type="Standard"))
+            if status != 201 or not isinstance(data, dict):
+                continue
+            # the create response carries no id; find the newest open request (reported as its own row)
+            status, mine = self.call(recorder, t, "ride-requests:my_requests", "GET", "/api/ride-requests/my_requests/")
+            open_ids = [r["id"] for r in mine or [] if r.get("status") == "OPEN"] if status == 200 else []
+            if not open_ids:
+                continue
+            req_id = max(open_ids)
+            give_up = time.monotonic() + self.opts["match_timeout"]
+            while time.monotonic() < min(give_up, deadline):
+                time.sleep(self.opts["poll_interval"])
+                status, req = self.call(recorder, t, "ride-requests:retrieve", "GET", f"/api/ride-requests/{req_id}/")
+                if status == 200 and req.get("status") != "OPEN":
+                    break
+            else:
+                self.call(recorder, t, "ride-requests:cancel", "POST", f"/api/ride-requests/{req_id}/cancel/")
+
+    def driver(self, t, recorder, deadline):
+        while time.monotonic() < deadline:
+            status, matches = self.call(recorder, t, "matches:list", "GET", "/api/matches/")
+            pending = [m["id"] for m in matches or [] if m.get("status") == "PENDING"] if status == 200 else []
+            if not pending:
+                time.sleep(self.opts["poll_interval"])
+                continue
+            status, ride = self.call(recorder, t, "matches:accept", "POST", f"/api/matches/{self.rnd.choice(pending)}/accept/")
+            if status != 200 or not isinstance(ride, dict):
+                continue
+            self.call(recorder, t, "rides:start", "POST", f"/api/rides/{ride['id']}/start/")
+            self.call(recorder, t, "rides:complete", "POST", f"/api/rides/{ride['id']}/complete/", {})
+
+    def run(self, drivers, customers):
+        recorder = Recorder()
+        deadline = None
+
+        def target(fn, transport):
+            try:
+                fn(transport, recorder, deadline)
+            finally:
+                connection.close()
+
+        # log everyone in up front: concurrent session writes would be part of the measurement
+        threads = [threading.Thread(target=target, args=(self.driver, self.transport(u)), name=f"load-driver-{i}")
+                   for i, u in enumerate(drivers)]
+        threads += [threading.Thread(target=target, args=(self.rider, self.transport(u)), name=f"load-rider-{i}")
+                    for i, u in enumerate(customers)]
+        self.stdout.write(f"Running {len(drivers) + len(customers)} simulated user(s) for {self.opts['duration']:g} s "
+                          f"({'HTTP ' + self.opts['url'] if self.opts['url'] else 'in-process'})")
+        deadline = time.monotonic() + self.opts["duration"]
+        t0 = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        return recorder, time.perf_counter() - t0
+
+    # -- report --
+
+    def report(self, recorder, elapsed):
+        # throughput and latencies cover 2xx responses only; 5xx includes calls with no response
+        header = (f"{'endpoint':<26}{'ok':>7}{'4xx':>6}{'5xx':>6}{'ok/s':>9}"
+                  f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        ok_total = client_errors = server_errors = 0
+        for endpoint in sorted(recorder.statuses):
+            values = sorted(recorder.latencies[endpoint])
+            statuses = recorder.statuses[endpoint]
+            n4xx = sum(n for code, n in statuses.items() if 400 <= code < 500)
+            n5xx = sum(n for code, n in statuses.items() if code >= 500 or code < 200)
+            ok_total, client_errors, server_errors = ok_total + len(values), client_errors + n4xx, server_errors + n5xx
+            timings = (f"{percentile(values, 50):>9.1f}{percentile(values, 95):>9.1f}"
+                       f"{percentile(values, 99):>9.1f}{values[-1]:>9.1f}") if values else f"{'-':>9}" * 4
+            self.stdout.write(f"{endpoint:<26}{len(values):>7}{n4xx:>6}{n5xx:>6}{len(values) / elapsed:>9.1f}{timings}")
+        self.stdout.write("-" * len(header))
+        calls = ok_total + client_errors + server_errors
+        self.stdout.write(f"{ok_total} ok of {calls} calls in {elapsed:.1f} s: {ok_total / elapsed:.1f} ok/s; "
+                          f"{client_errors} 4xx, {server_errors} 5xx")
+        completed = recorder.statuses["rides:complete"][200]
+        self.stdout.write(f"Rides completed: {completed} ({completed / elapsed:.2f}/s)")
+        for endpoint in sorted(recorder.statuses):
+            odd = {code: n for code, n in recorder.statuses[endpoint].items() if not 200 <= code < 300}
+            if odd:
+                self.stdout.write(f"  {endpoint}: " + ", ".join(f"{code}x{n}" for code, n in sorted(odd.items())))
+        if calls and (client_errors + server_errors) / calls > self.opts["max_error_ratio"]:
+            raise CommandError(f"{client_errors + server_errors} of {calls} calls failed "
+                               f"(more than {self.opts['max_error_ratio']:.0%}); the numbers above are not a load result.")
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ride.assignment import run_batch_tick
+from ride.dispatch import STRATEGY_BATCH, STRATEGY_WAVES, WaveScheduler, default_worker_id, process_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a background dispatch worker: offers queued ride requests to their first wave "
+        "of drivers and fires the timers that widen the search for unanswered requests. "
+        "With RIDE_MATCHING_STRATEGY = \"batch\" it runs a batched assignment tick instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-id", default=None, help="Identifier recorded on claimed tasks (default: host:pid).")
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+
+    def handle(self, *args, **opts):
+        worker_id = opts["worker_id"] or default_worker_id()
+        if getattr(settings, "RIDE_MATCHING_STRATEGY", STRATEGY_WAVES) == STRATEGY_BATCH:
+            return self.run_batches(worker_id, opts)
+        self.stdout.write(f"Dispatch worker {worker_id} started")
+        scheduler = WaveScheduler()
+        total = 0
+        try:
+            while True:
+                n = process_queue(worker_id, opts["batch_size"])
+                waves = scheduler.run_due()
+                total += n
+                close_old_connections()
+                if n:
+                    continue
+                if opts["once"]:
+                    break
+                if not waves:
+                    time.sleep(opts["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Dispatch worker {worker_id} processed {total} task(s)")
+
+    def run_batches(self, worker_id, opts):
+        tick = float(getattr(settings, "RIDE_BATCH_TICK_SECONDS", 3))
+        self.stdout.write(f"Batch dispatch worker {worker_id} started (tick {tick:g}s)")
+        total = 0
+        try:
+            while True:
+                started = time.monotonic()
+                result = run_batch_tick(worker_id=worker_id)
+                close_old_connections()
+                total += result.matches
+                if result.requests:
+                    self.stdout.write(
+                        f"Tick: {result.matches} match(es) for {result.requests} waiting request(s) "
+                        f"in {result.elapsed_ms:.1f} ms"
+                    )
+                if opts["once"]:
+                    break
+                time.sleep(max(0.0, tick - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Batch dispatch worker {worker_id} created {total} match(es)")
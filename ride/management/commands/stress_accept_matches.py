@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from ride.models import MatchStatus, PaymentMethod, Ride, RideRequest, RideRequestMatch, RideRequestStatus
+from ride.services import accept_match
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent accept stress test: every simulated driver is offered every request and "
+        "all drivers race to accept them from their own thread. Reports accepts per second "
+        "and checks that each request ended up with exactly one ride (exits non-zero if not). Creates its own "
+        "users, requests and matches and deletes them afterwards (unless --keep)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--drivers", type=int, default=16, help="Simulated drivers, one thread each.")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--keep", action="store_true", help="Leave the generated rows in the database.")
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        tag = uuid.uuid4().hex[:8]
+        customer, drivers, request_ids = self.setup(tag, opts["requests"], opts["drivers"])
+        try:
+            stats, elapsed = self.race(drivers, request_ids, rnd)
+            self.report(stats, elapsed, request_ids)
+        finally:
+            if not opts["keep"]:
+                self.cleanup(customer, drivers, request_ids)
+
+    def setup(self, tag, n_requests, n_drivers):
+        User = apps.get_model("profiles", "CustomUser")
+        Driver = apps.get_model("profiles", "Driver")
+
+        def user(name):
+            return User.objects.create_user(
+                username=f"stress-{tag}-{name}", phone_number="0", email=f"stress-{tag}-{name}@example.com",
+                password=None, first_name="Stress", last_name=name,
+            )
+
+        customer = user("customer")
+        drivers = [Driver.objects.create(user=user(f"driver{i}"), is_available=True,
+                                         current_lat=Decimal("6.524400"), current_lng=Decimal("3.379200"))
+                   for i in range(n_drivers)]
+        expires = timezone.now() + timedelta(hours=1)
+        # bulk_create skips the post_save pipeline: no estimates, no dispatch
+        RideRequest.objects.bulk_create([
+            RideRequest(customer=customer, pickup_address="Stress pickup", dropoff_address="Stress dropoff",
+                        pickup_lat=Decimal("6.524400"), pickup_lng=Decimal("3.379200"),
+                        dropoff_lat=Decimal("6.600000"), dropoff_lng=Decimal("3.400000"),
+                        payment_method=PaymentMethod.CASH, status=RideRequestStatus.OPEN, expires_at=expires)
+            for _ in range(n_requests)
+        ])
+        request_ids = list(RideRequest.objects.filter(customer=customer).values_list("pk", flat=True))
+        RideRequestMatch.objects.bulk_create([
+            RideRequestMatch(request_id=rid, driver=d, status=MatchStatus.PENDING,
+                             distance_to_pickup_km=Decimal("1.00"), eta_to_pickup_min=3)
+            for rid in request_ids for d in drivers
+        ], batch_size=500)
+        return customer, drivers, request_ids
+
+    def race(self, drivers, request_ids, rnd):
+        stats = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(drivers) + 1)
+        plans = {}
+        for d in drivers:
+            matches = list(RideRequestMatch.objects.filter(driver=d, request_id__in=request_ids)
+                           .select_related("request", "driver"))
+            rnd.shuffle(matches)
+            plans[d.pk] = matches
+
+        def run(driver):
+            local = Counter()
+            try:
+                barrier.wait()
+                for match in plans[driver.pk]:
+                    t0 = time.perf_counter()
+                    try:
+                        accept_match(match, driver.user)
+                        local["accepted"] += 1
+                    except (ValidationError, PermissionDenied):
+                        local["lost"] += 1
+                    except DatabaseError:
+                        local["db_errors"] += 1
+                    local["attempt_ms"] += (time.perf_counter() - t0) * 1000.0
+            finally:
+                connection.close()
+                with lock:
+                    stats.update(local)
+
+        threads = [threading.Thread(target=run, args=(d,), name=f"stress-driver-{i}") for i, d in enumerate(drivers)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        return stats, time.perf_counter() - t0
+
+    def report(self, stats, elapsed, request_ids):
+        attempts = stats["accepted"] + stats["lost"] + stats["db_errors"]
+        rides = Counter(Ride.objects.filter(source_request__pk__in=request_ids).values_list("source_request__pk", flat=True))
+        orphan_rides = Ride.objects.filter(customer__username__startswith="stress-", source_request__isnull=True,
+                                           requested_at__gte=timezone.now() - timedelta(hours=1)).count()
+        accepted_matches = Counter(RideRequestMatch.objects.filter(request_id__in=request_ids, status=MatchStatus.ACCEPTED)
+                                   .values_list("request_id", flat=True))
+        doubled = sum(1 for n in accepted_matches.values() if n > 1)
+        self.stdout.write(f"{len(request_ids)} requests, {attempts} accept attempts in {elapsed:.3f} s")
+        self.stdout.write(f"  accepted:      {stats['accepted']} ({stats['accepted'] / elapsed:.1f}/s)")
+        self.stdout.write(f"  lost the race: {stats['lost']}")
+        self.stdout.write(f"  DB errors:     {stats['db_errors']}")
+        self.stdout.write(f"  attempts/s:    {attempts / elapsed:.1f} (mean {stats['attempt_ms'] / max(attempts, 1):.1f} ms)")
+        self.stdout.write(f"  requests with a ride: {len(rides)}, unlinked rides: {orphan_rides}, "
+                          f"requests with >1 accepted match: {doubled}")
+        ok = stats["accepted"] == len(rides) == len(request_ids) and not orphan_rides and not doubled
+        if not ok:
+            raise CommandError("FAIL: requests and rides do not match one to one")
+        self.stdout.write(self.style.SUCCESS("OK: exactly one ride per request"))
+
+    def cleanup(self, customer, drivers, request_ids):
+        Ride.objects.filter(customer=customer).delete()
+        RideRequest.objects.filter(pk__in=request_ids).delete()
+        for d in drivers:
+            d.user.delete()
+        customer.delete()
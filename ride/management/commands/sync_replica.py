@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.routers import REPLICA_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica file: a stand-in for "
+        "replication when trying the read replica locally with two SQLite files. "
+        "With --interval it repeats, so the replica lags the primary by up to that long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Seconds between copies; 0 copies once.")
+
+    def handle(self, *args, **opts):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            raise CommandError("No replica database configured (set DJANGO_DB_REPLICA_NAME).")
+        primary, replica = settings.DATABASES["default"], settings.DATABASES[REPLICA_DB_ALIAS]
+        if "sqlite3" not in primary["ENGINE"] or "sqlite3" not in replica["ENGINE"]:
+            raise CommandError("sync_replica only copies SQLite files; use the database's own replication.")
+        while True:
+            t0 = time.perf_counter()
+            self.copy(str(primary["NAME"]), str(replica["NAME"]))
+            self.stdout.write(f"Copied {primary['NAME']} -> {replica['NAME']} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            if not opts["interval"]:
+                return
+            time.sleep(opts["interval"])
+
+    def copy(self, source: str, target: str) -> None:
+        # the online backup API gives a consistent snapshot while the primary takes writes
+        src, dst = sqlite3.connect(source), sqlite3.connect(target, timeout=30)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
@@ -0,0 +1,41 @@
+import functools
+
+from diagnostics.metrics import metrics
+
+from .models import MatchStatus, RideRequest, RideRequestMatch, RideRequestStatus
+
+operation_seconds = metrics.histogram(
+    "ride_operation_duration_seconds", "Time spent in dispatch, pricing and ride state transitions.", ["operation"])
+operation_errors = metrics.counter(
+    "ride_operation_errors_total", "Dispatch, pricing and state-transition calls that raised.", ["operation", "error"])
+matches_created = metrics.counter("ride_matches_created_total", "Driver matches offered to riders.")
+
+
+def instrumented(operation: str):
+    """
+    Time every call to the decorated function under `operation` and count the
+    exceptions it raises by class (a lost accept race shows up as ValidationError).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with operation_seconds.time(operation=operation):
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    operation_errors.inc(operation=operation, error=type(e).__name__)
+                    raise
+        return wrapper
+    return decorator
+
+
+def _available_drivers() -> int:
+    from .services import available_drivers_qs
+    return available_drivers_qs().count()
+
+
+metrics.gauge("ride_open_requests", "Ride requests waiting for a driver.",
+              lambda: RideRequest.objects.filter(status=RideRequestStatus.OPEN).count())
+metrics.gauge("ride_pending_matches", "Match offers waiting for a driver's answer.",
+              lambda: RideRequestMatch.objects.filter(status=MatchStatus.PENDING).count())
+metrics.gauge("ride_available_drivers", "Drivers marked available.", _available_drivers)
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispatchTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=128)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dispatch_task', to='ride.riderequest')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dispatchtask',
+            index=models.Index(fields=['status', 'created_at'], name='ride_dispat_status_a6d510_idx'),
+        ),
+    ]
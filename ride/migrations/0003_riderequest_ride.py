@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_existing_rides(apps, schema_editor):
+    # rides created by accept_match copy the request's customer, pickup and requested_at
+    RideRequest = apps.get_model("ride", "RideRequest")
+    Ride = apps.get_model("ride", "Ride")
+    linked = set()
+    for rr in RideRequest.objects.filter(status="MATCHED", ride__isnull=True).iterator():
+        ride = (Ride.objects
+                .filter(customer_id=rr.customer_id, pickup_lat=rr.pickup_lat, pickup_lng=rr.pickup_lng, requested_at=rr.requested_at)
+                .exclude(pk__in=linked)
+                .first())
+        if ride:
+            linked.add(ride.pk)
+            RideRequest.objects.filter(pk=rr.pk).update(ride=ride)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0002_dispatchtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riderequest',
+            name='ride',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='source_request', to='ride.ride'),
+        ),
+        migrations.RunPython(link_existing_rides, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0003_riderequest_ride'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='riderequest',
+            index=models.Index(fields=['status', 'expires_at'], name='ride_ridere_status_54c5f7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='riderequestmatch',
+            index=models.Index(fields=['status', 'created_at'], name='ride_ridere_status_f29b17_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0004_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riderequest',
+            name='dispatch_wave',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='riderequest',
+            name='next_wave_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='riderequest',
+            index=models.Index(fields=['status', 'next_wave_at'], name='ride_ridere_status_e403c1_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0005_dispatch_waves'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelSpeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zone_lat', models.IntegerField()),
+                ('zone_lng', models.IntegerField()),
+                ('hour_of_week', models.PositiveSmallIntegerField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.FloatField(default=0.0)),
+                ('duration_h', models.FloatField(default=0.0)),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='travelspeed',
+            constraint=models.UniqueConstraint(fields=('zone_lat', 'zone_lng', 'hour_of_week'), name='unique_speed_zone_hour'),
+        ),
+    ]
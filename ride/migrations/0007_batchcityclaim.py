@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0006_travelspeed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchCityClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=64, unique=True)),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=128)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
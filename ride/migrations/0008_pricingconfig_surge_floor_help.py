@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:01
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ride', '0007_batchcityclaim'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pricingconfig',
+            name='surge_multiplier',
+            field=models.DecimalField(decimal_places=2, default=Decimal('1.00'), help_text="Minimum surge for metered fares. While live surge (RIDE_SURGE_ENABLED) is on, a pickup zone's higher live multiplier replaces it.", max_digits=4),
+        ),
+    ]
@@ -54,7 +54,11 @@ class PricingConfig(models.Model):
     min_fare = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("600.00"))
 
     # Surge multiplier (1.0 = no surge)
-    surge_multiplier = models.DecimalField(max_digits=4, decimal_places=2, default=Decimal("1.00"))
+    surge_multiplier = models.DecimalField(
+        max_digits=4, decimal_places=2, default=Decimal("1.00"),
+        help_text="Minimum surge for metered fares. While live surge (RIDE_SURGE_ENABLED) is on, "
+                  "a pickup zone's higher live multiplier replaces it.",
+    )
 
     # Platform commission percent (0-100). Applied on gross; informational for payout calc.
     commission_pct = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal("15.00"))
@@ -143,6 +147,11 @@ class RideRequest(models.Model):
     requested_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=RideRequestStatus.choices, default=RideRequestStatus.OPEN, db_index=True)
     expires_at = models.DateTimeField(blank=True, null=True)
+    # wave-based dispatch: waves offered so far and when the next one is due
+    dispatch_wave = models.PositiveSmallIntegerField(default=0)
+    next_wave_at = models.DateTimeField(blank=True, null=True)
+    # the ride created when a driver accepted this request
+    ride = models.OneToOneField("ride.Ride", on_delete=models.SET_NULL, blank=True, null=True, related_name="source_request")
 
     # city/vehicle-type for pricing selection
     city = models.CharField(max_length=64, default="Lagos")
@@ -155,6 +164,8 @@ class RideRequest(models.Model):
             models.Index(fields=["customer", "status"]),
             models.Index(fields=["city"]),
             models.Index(fields=["vehicle_type"]),
+            models.Index(fields=["status", "expires_at"]),
+            models.Index(fields=["status", "next_wave_at"]),
         ]
         ordering = ["-requested_at"]
 
@@ -173,12 +184,85 @@ class RideRequestMatch(models.Model):
 
     class Meta:
         constraints = [models.UniqueConstraint(fields=["request", "driver"], name="unique_request_driver")]
-        indexes = [models.Index(fields=["status"]), models.Index(fields=["created_at"])]
+        indexes = [
+            models.Index(fields=["status"]),
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
 
     def __str__(self):
         return f"Match req={self.request_id} driver={self.driver_id} ({self.status})"
 
 
+# —— Background dispatch —— #
+
+class DispatchTaskStatus(models.TextChoices):
+    QUEUED = "QUEUED", "Queued"
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    FAILED = "FAILED", "Failed"
+
+
+class DispatchTask(models.Model):
+    """
+    Matching work for one ride request, claimed by `run_dispatch_worker` processes.
+    """
+    request = models.OneToOneField("ride.RideRequest", on_delete=models.CASCADE, related_name="dispatch_task")
+    status = models.CharField(max_length=10, choices=DispatchTaskStatus.choices, default=DispatchTaskStatus.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=128, blank=True, default="")
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"DispatchTask req={self.request_id} ({self.status})"
+
+
+class BatchCityClaim(models.Model):
+    """
+    Lease on one city's batch matching tick, so only one dispatch worker assigns a
+    city's drivers at a time. Taken and released with conditional UPDATEs.
+    """
+    city = models.CharField(max_length=64, unique=True)  # normalized: stripped, lower case
+    claimed_by = models.CharField(max_length=128, blank=True, default="")
+    claimed_until = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"BatchCityClaim {self.city} ({self.claimed_by or 'free'})"
+
+
+class TravelSpeed(models.Model):
+    """
+    Observed average speed per zone (RIDE_SPEED_ZONE_DEG pickup grid cell) and hour of
+    week (0 = Monday 00:00, local time), rebuilt offline by `manage.py build_speed_table`.
+    Sums are kept rather than a speed so coarser fallbacks can be aggregated exactly.
+    """
+    zone_lat = models.IntegerField()
+    zone_lng = models.IntegerField()
+    hour_of_week = models.PositiveSmallIntegerField()
+    samples = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0.0)
+    duration_h = models.FloatField(default=0.0)
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["zone_lat", "zone_lng", "hour_of_week"], name="unique_speed_zone_hour"),
+        ]
+
+    @property
+    def speed_kmh(self) -> float:
+        return self.distance_km / self.duration_h if self.duration_h else 0.0
+
+    def __str__(self):
+        return f"Zone ({self.zone_lat}, {self.zone_lng}) h{self.hour_of_week}: {self.speed_kmh:.1f} km/h"
+
+
 # —— Negotiation (inDrive-like) —— #
 
 class NegotiationOffer(models.Model):
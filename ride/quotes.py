@@ -0,0 +1,96 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from math import floor
+from typing import Any, Dict, Hashable, Optional
+
+from django.conf import settings
+
+from .tariffs import tariff_cache, tariff_key
+
+
+class TTLLRUCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after being set.
+    Counts hits, misses and evictions so it can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _cell(coord: float, cell_deg: float) -> int:
+    return floor(coord / cell_deg)
+
+
+def quote_cache_key(pickup_lat: float, pickup_lng: float, dropoff_lat: float, dropoff_lng: float,
+                    city: str, vehicle_type: str, surge=None) -> tuple:
+    """
+    Pickup/dropoff quantized to RIDE_QUOTE_CELL_DEG cells, plus the tariff, its
+    pricing config version and the live surge multiplier, so any tariff edit or
+    surge change naturally misses the old entries.
+    """
+    cell_deg = getattr(settings, "RIDE_QUOTE_CELL_DEG", 0.001)
+    return (
+        _cell(pickup_lat, cell_deg), _cell(pickup_lng, cell_deg),
+        _cell(dropoff_lat, cell_deg), _cell(dropoff_lng, cell_deg),
+        *tariff_key(city, vehicle_type),
+        tariff_cache.version,
+        surge,
+    )
+
+
+quote_cache = TTLLRUCache(
+    maxsize=getattr(settings, "RIDE_QUOTE_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "RIDE_QUOTE_CACHE_TTL_SECONDS", 60),
+)
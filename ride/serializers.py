@@ -1,4 +1,5 @@
 from decimal import Decimal
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
     RideRequest, RideRequestMatch, Ride,
@@ -21,8 +22,9 @@ class RideRequestCreateSerializer(serializers.ModelSerializer):
         return v
 
     def create(self, validated_data):
+        from .services import create_ride_request
         user = self.context["request"].user
-        return RideRequest.objects.create(customer=user, **validated_data)
+        return create_ride_request(user, **validated_data).request
 
 
 class RideRequestSerializer(serializers.ModelSerializer):
@@ -76,3 +78,21 @@ class RideCompleteSerializer(serializers.Serializer):
     end_lat = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
     end_lng = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
     end_address = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class DriverLocationSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        # devices send full float precision; Driver stores 6 decimal places
+        attrs["lat"] = Decimal(str(round(attrs["lat"], 6)))
+        attrs["lng"] = Decimal(str(round(attrs["lng"], 6)))
+        return attrs
+
+
+class DriverLocationBatchSerializer(serializers.Serializer):
+    # checked before any ping is validated, so an oversized batch is cheap to refuse
+    pings = DriverLocationSerializer(many=True, allow_empty=False,
+                                     max_length=getattr(settings, "RIDE_LOCATION_MAX_BATCH", 100))
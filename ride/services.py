@@ -1,30 +1,38 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional, Tuple, List
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Optional, Tuple, List
 
-from django.db import transaction
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.apps import apps
 
-from math import radians, sin, cos, asin, sqrt
-
+from .geo import (
+    EARTH_RADIUS_KM, haversine_km, haversine_km_batch, eta_min_batch, select_nearest,
+    bounding_box, DriverGridIndex, IndexedDriver
+)
+from .changes import touch_requests
+from .dispatch import enqueue_matching
+from .locations import LocationPing, location_buffer
+from .tariffs import tariff_cache, default_pricing_config
+from .travel import speed_table, hour_of_week, DEFAULT_PICKUP_SPEED_KMH, DEFAULT_TRIP_SPEED_KMH
+from .surge import surge_engine
+from .metrics import instrumented, matches_created
 from .models import (
     RideRequest, RideRequestStatus, RideRequestMatch, MatchStatus,
     Ride, RideStatus, PaymentMethod,
     PricingConfig, PricingMode, NegotiationOffer
 )
 
-EARTH_RADIUS_KM = 6371.0
-
-def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    lat1, lng1, lat2, lng2 = map(radians, [lat1, lng1, lat2, lng2])
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlng / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    return EARTH_RADIUS_KM * c
+logger = logging.getLogger(__name__)
 
 
 # ---- Pricing (Metered) ----
@@ -37,30 +45,137 @@ class PriceBand:
 def round_money(x: Decimal) -> Decimal:
     return x.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-def metered_quote(distance_km: Decimal, duration_min: Decimal, cfg: PricingConfig, discount: Decimal = Decimal("0.00")) -> PriceBand:
+def metered_quote(distance_km: Decimal, duration_min: Decimal, cfg: PricingConfig, discount: Decimal = Decimal("0.00"),
+                  surge: Optional[Decimal] = None) -> PriceBand:
+    """
+    Fare band for a trip. `surge` is the pickup zone's live multiplier (see
+    `current_surge`); the tariff's surge_multiplier is the floor under it, and
+    applies alone without one.
+    """
     total = cfg.base_fare + cfg.per_km * distance_km + cfg.per_min * duration_min + cfg.booking_fee
-    total = total * cfg.surge_multiplier
+    total = total * (cfg.surge_multiplier if surge is None else max(surge, cfg.surge_multiplier))
     total = max(total, cfg.min_fare)
     total = max(total - discount, Decimal("0.00"))
     total = round_money(total)
     band = round_money(total * Decimal("0.10"))
     return PriceBand(low=max(total - band, Decimal("0.00")), high=total + band)
 
+def current_surge(pickup_lat, pickup_lng) -> Optional[Decimal]:
+    """
+    Live surge multiplier for the pickup's zone, or None when RIDE_SURGE_ENABLED is off.
+    """
+    if not getattr(settings, "RIDE_SURGE_ENABLED", True):
+        return None
+    return surge_engine.multiplier(pickup_lat, pickup_lng)
+
 def get_pricing_config(city: str, vehicle_type: str) -> PricingConfig:
-    cfg = PricingConfig.objects.filter(city__iexact=city, vehicle_type__iexact=vehicle_type, active=True).first()
-    if not cfg:
-        # fallback default
-        cfg = PricingConfig.objects.create(
-            city=city, vehicle_type=vehicle_type, mode=PricingMode.METERED,
-            base_fare=Decimal("250.00"), per_km=Decimal("120.00"), per_min=Decimal("10.00"),
-            booking_fee=Decimal("100.00"), min_fare=Decimal("600.00"),
-            surge_multiplier=Decimal("1.00"), commission_pct=Decimal("15.00"), active=True
-        )
-    return cfg
+    """
+    Active tariff for (city, vehicle_type), case-insensitive, served from the
+    process-wide tariff cache. Falls back to an unsaved default (never writes).
+    """
+    return tariff_cache.get(city, vehicle_type) or default_pricing_config(city, vehicle_type)
+
+def get_city_pricing_configs(city: str) -> List[PricingConfig]:
+    """
+    Every active tariff for the city, ordered by vehicle type (default tariff if none).
+    """
+    configs = tariff_cache.for_city(city)
+    if not configs:
+        return [default_pricing_config(city, "Standard")]
+    return sorted(configs, key=lambda c: c.vehicle_type.lower())
+
+
+# ---- Driver candidates ----
+
+CANDIDATE_DRIVER_FIELDS = ("id", "is_available", "current_lat", "current_lng", "vehicle_id")
+
+def available_drivers_qs():
+    Driver = apps.get_model("profiles", "Driver")
+    # `is_available=True` compiles to a bare `WHERE is_available` on SQLite, which
+    # cannot seek the composite index; `IN (1)` can.
+    return Driver.objects.filter(is_available__in=[True], current_lat__isnull=False, current_lng__isnull=False)
+
+def candidate_drivers_qs(pickup_lat: float, pickup_lng: float, radius_km: float = 8.0):
+    """
+    Available, located drivers inside the radius' bounding box, filtered in SQL
+    (backed by the (is_available, current_lat, current_lng) index on Driver).
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(pickup_lat, pickup_lng, radius_km)
+    return available_drivers_qs().filter(
+        current_lat__range=(Decimal(str(round(min_lat, 6))), Decimal(str(round(max_lat, 6)))),
+        current_lng__range=(Decimal(str(round(min_lng, 6))), Decimal(str(round(max_lng, 6)))),
+    ).only(*CANDIDATE_DRIVER_FIELDS)
+
+
+# ---- Driver index ----
+
+_driver_index = DriverGridIndex(getattr(settings, "RIDE_DRIVER_GRID_CELL_DEG", 0.02))
+_driver_index_loaded_at: Optional[float] = None
+
+def load_driver_index() -> DriverGridIndex:
+    """
+    Rebuild the in-process grid from the database (available drivers with a location).
+    """
+    global _driver_index_loaded_at
+    # positions still waiting in the write-behind buffer are newer than the table
+    pending = location_buffer.snapshot()
+    rows = available_drivers_qs().values_list("id", "current_lat", "current_lng", "vehicle_id")
+    entries = []
+    for pk, lat, lng, vid in rows.iterator():
+        ping = pending.get(pk)
+        if ping is not None:
+            lat, lng = ping.lat, ping.lng
+        entries.append(IndexedDriver(pk, float(lat), float(lng), vid))
+    _driver_index.replace_all(entries)
+    _driver_index_loaded_at = time.monotonic()
+    return _driver_index
+
+def get_driver_index(max_age: Optional[float] = None) -> DriverGridIndex:
+    # Signals keep the grid in step with this process' writes; the periodic reload
+    # picks up writes made by other workers. `max_age` overrides that period.
+    if max_age is None:
+        max_age = getattr(settings, "RIDE_DRIVER_INDEX_REFRESH_SECONDS", 30) or None  # 0: never reload
+    if _driver_index_loaded_at is None or (max_age is not None and time.monotonic() - _driver_index_loaded_at > max_age):
+        load_driver_index()
+    return _driver_index
+
+def sync_driver_index(driver) -> None:
+    loc = _get_driver_location(driver)
+    if getattr(driver, "is_available", False) and loc:
+        _driver_index.upsert(driver.pk, loc[0], loc[1], getattr(driver, "vehicle_id", None))
+        surge_engine.track_driver(driver.pk, loc[0], loc[1], True)
+    else:
+        _driver_index.remove(driver.pk)
+        surge_engine.track_driver(driver.pk, None, None, False)
+
+
+def record_driver_locations(driver, points) -> int:
+    """
+    Buffer (lat, lng, recorded_at) pings for `driver`. The database sees only the
+    latest position per flush; the driver index is updated right away. Returns the
+    number of pings accepted (stale and future-dated ones are dropped).
+    """
+    now = timezone.now()
+    pings = [LocationPing(driver.pk, lat, lng, recorded_at or now) for lat, lng, recorded_at in points]
+    if not pings:
+        return 0
+    accepted = location_buffer.push(pings)
+    latest = location_buffer.latest(driver.pk)
+    if accepted and latest is not None:
+        driver.current_lat, driver.current_lng = latest.lat, latest.lng
+        sync_driver_index(driver)
+    return accepted
 
 
 # ---- Nearby Drivers ----
 
+@dataclass
+class DriverCandidate:
+    driver_id: int
+    vehicle_id: Optional[int]
+    distance_km: Decimal
+    eta_min: int
+
 def _get_driver_location(driver) -> Optional[Tuple[float, float]]:
     lat = getattr(driver, "current_lat", None)
     lng = getattr(driver, "current_lng", None)
@@ -77,61 +192,116 @@ def _estimate_eta_min(distance_km: float, avg_speed_kmh: float = 24.0) -> int:
     minutes = (distance_km / avg_speed_kmh) * 60.0
     return max(1, int(round(minutes)))
 
-def find_nearby_drivers(driver_qs, pickup_lat: float, pickup_lng: float, radius_km: float = 8.0, limit: int = 5):
-    from dataclasses import dataclass
-    @dataclass
-    class DriverCandidate:
-        driver_id: int
-        vehicle_id: Optional[int]
-        distance_km: Decimal
-        eta_min: int
-    cands: List[DriverCandidate] = []
-    for d in driver_qs:
-        if not getattr(d, "is_available", False):
-            continue
-        loc = _get_driver_location(d)
-        if not loc:
-            continue
-        dlat, dlng = loc
-        dist = haversine_km(pickup_lat, pickup_lng, dlat, dlng)
-        if dist <= radius_km:
-            vehicle_id = getattr(d, "active_vehicle_id", None) or getattr(d, "vehicle_id", None) or None
-            cands.append(DriverCandidate(
-                driver_id=d.id,
-                vehicle_id=vehicle_id,
-                distance_km=Decimal(str(round(dist, 2))),
-                eta_min=_estimate_eta_min(dist)
-            ))
-    cands.sort(key=lambda c: (c.distance_km, c.eta_min))
-    return cands[:limit]
+def batch_distance_eta(lat1, lng1, lat2, lng2, avg_speed_kmh: float = 24.0):
+    """
+    Distances (km) and ETAs (minutes) for whole arrays of coordinate pairs in one
+    vectorized call; scalars broadcast, so one origin against N drivers works too.
+    """
+    dists = haversine_km_batch(lat1, lng1, lat2, lng2)
+    return dists, eta_min_batch(dists, avg_speed_kmh)
+
+def estimate_trips(pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs) -> List[Tuple[Decimal, Decimal]]:
+    """
+    (distance_km, duration_min) per trip: straight-line distance at the learned speed
+    for the pickup zone and current hour of week (~22km/h where nothing was learned).
+    """
+    dists = haversine_km_batch(pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs)
+    how = hour_of_week()
+    out = []
+    for lat, lng, d in zip(pickup_lats, pickup_lngs, dists):
+        speed = speed_table.speed_kmh(float(lat), float(lng), how=how, default=DEFAULT_TRIP_SPEED_KMH)
+        out.append((Decimal(str(round(float(d), 2))), Decimal(_estimate_eta_min(float(d), speed))))
+    return out
+
+@instrumented("find_nearby_drivers")
+def find_nearby_drivers(driver_qs, pickup_lat: float, pickup_lng: float, radius_km: float = 8.0, limit: int = 5) -> List[DriverCandidate]:
+    """
+    Nearest available drivers around the pickup. With `driver_qs=None` the lookup is
+    served from the in-process driver grid (or, when it is disabled, from the SQL
+    bounding-box query); otherwise the given iterable is scanned.
+    """
+    if driver_qs is None and not getattr(settings, "RIDE_DRIVER_INDEX_ENABLED", True):
+        driver_qs = candidate_drivers_qs(pickup_lat, pickup_lng, radius_km)
+    if driver_qs is None:
+        hits = get_driver_index().nearest(pickup_lat, pickup_lng, k=limit, max_radius_km=radius_km)
+        ids = [e.driver_id for _, e in hits]
+        vehicle_ids = [e.vehicle_id for _, e in hits]
+        dists = [d for d, _ in hits]
+        top = range(len(hits))
+    else:
+        ids, vehicle_ids, lats, lngs = [], [], [], []
+        for d in driver_qs:
+            if not getattr(d, "is_available", False):
+                continue
+            loc = _get_driver_location(d)
+            if not loc:
+                continue
+            ids.append(d.id)
+            vehicle_ids.append(getattr(d, "active_vehicle_id", None) or getattr(d, "vehicle_id", None) or None)
+            lats.append(loc[0])
+            lngs.append(loc[1])
+        if not ids:
+            return []
+        dists = haversine_km_batch(pickup_lat, pickup_lng, lats, lngs)
+        top = select_nearest(dists, radius_km, limit)
+    # only the survivors pay for ETA and Decimal conversion
+    top_dists = [float(dists[i]) for i in top]
+    etas = eta_min_batch(top_dists, speed_table.speed_kmh(pickup_lat, pickup_lng, default=DEFAULT_PICKUP_SPEED_KMH))
+    return [
+        DriverCandidate(
+            driver_id=ids[i],
+            vehicle_id=vehicle_ids[i],
+            distance_km=Decimal(str(round(dist, 2))),
+            eta_min=int(eta),
+        )
+        for i, dist, eta in zip(top, top_dists, etas)
+    ]
 
+@instrumented("build_matches_for_request")
 @transaction.atomic
-def build_matches_for_request(req: RideRequest, driver_qs, limit: int = 5) -> int:
-    cands = find_nearby_drivers(driver_qs, float(req.pickup_lat), float(req.pickup_lng), limit=limit)
-    created = 0
-    for c in cands:
-        RideRequestMatch.objects.get_or_create(
-            request=req, driver_id=c.driver_id,
-            defaults={
-                "vehicle_id": c.vehicle_id,
-                "status": MatchStatus.PENDING,
-                "distance_to_pickup_km": c.distance_km,
-                "eta_to_pickup_min": c.eta_min,
-            }
+def build_matches_for_request(req: RideRequest, driver_qs=None, limit: int = 5, radius_km: float = 8.0) -> int:
+    """
+    Insert PENDING matches for the `limit` nearest drivers not yet offered this request,
+    with a single bulk INSERT (the unique_request_driver constraint absorbs races).
+    Returns the number of matches this call created, not counting drivers another
+    dispatcher offered the request to in the meantime.
+    """
+    matches = RideRequestMatch.objects.filter(request=req)
+    offered = set(matches.values_list("driver_id", flat=True))
+    cands = find_nearby_drivers(driver_qs, float(req.pickup_lat), float(req.pickup_lng),
+                                radius_km=radius_km, limit=limit + len(offered))
+    cands = [c for c in cands if c.driver_id not in offered][:limit]
+    if not cands:
+        return 0
+    new = [
+        RideRequestMatch(
+            request=req,
+            driver_id=c.driver_id,
+            vehicle_id=c.vehicle_id,
+            status=MatchStatus.PENDING,
+            distance_to_pickup_km=c.distance_km,
+            eta_to_pickup_min=c.eta_min,
         )
-        created += 1
+        for c in cands
+    ]
+    RideRequestMatch.objects.bulk_create(new, ignore_conflicts=True)
+    # bulk_create stamped created_at on our objects; a row that conflicted keeps the other insert's
+    ours = {(m.driver_id, m.created_at) for m in new}
+    created = sum(1 for row in matches.filter(driver_id__in=[m.driver_id for m in new])
+                  .values_list("driver_id", "created_at") if row in ours)
+    matches_created.inc(created)
+    if created:
+        touch_requests([req.pk])
     return created
 
+@instrumented("compute_request_estimates")
 def compute_request_estimates(req: RideRequest) -> None:
-    # distance
-    dist_km = Decimal(str(round(haversine_km(float(req.pickup_lat), float(req.pickup_lng),
-                                             float(req.dropoff_lat), float(req.dropoff_lng)), 2)))
-    # crude duration estimate using avg speed ~22km/h
-    duration_min = Decimal(str(_estimate_eta_min(float(dist_km), avg_speed_kmh=22.0)))
+    (dist_km, duration_min), = estimate_trips([float(req.pickup_lat)], [float(req.pickup_lng)],
+                                              [float(req.dropoff_lat)], [float(req.dropoff_lng)])
 
     cfg = get_pricing_config(req.city, req.vehicle_type)
     if cfg.mode == PricingMode.METERED:
-        band = metered_quote(dist_km, duration_min, cfg)
+        band = metered_quote(dist_km, duration_min, cfg, surge=current_surge(req.pickup_lat, req.pickup_lng))
         req.distance_km = dist_km
         req.estimated_amount_low = band.low
         req.estimated_amount_high = band.high
@@ -144,62 +314,126 @@ def compute_request_estimates(req: RideRequest) -> None:
         req.save(update_fields=["distance_km", "estimated_amount_low", "estimated_amount_high"])
 
 
-# ---- State transitions ----
+# ---- Request creation pipeline ----
 
-@transaction.atomic
-def accept_match(match: "RideRequestMatch", driver_user) -> Ride:
-    if match.status != MatchStatus.PENDING:
-        raise ValidationError("Match is not pending.")
-    if match.driver.user_id != driver_user.id:
-        raise PermissionDenied("You cannot accept someone else's match.")
+@dataclass
+class RequestPipelineResult:
+    request: RideRequest
+    timings_ms: Dict[str, float]
 
-    req = match.request
-    if req.status != RideRequestStatus.OPEN:
-        raise ValidationError("Ride request is not open anymore.")
+@contextmanager
+def _stage(timings: Dict[str, float], name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - t0) * 1000.0, 3)
+
+def run_request_pipeline(req: RideRequest, timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Post-create stages for a saved request: fare estimate, then dispatch.
+    """
+    timings = {} if timings is None else timings
+    with _stage(timings, "estimate"):
+        compute_request_estimates(req)
+    with _stage(timings, "dispatch"):
+        enqueue_matching(req)
+    return timings
 
-    # lock other matches
-    RideRequestMatch.objects.filter(request=req).exclude(pk=match.pk).update(status=MatchStatus.REJECTED)
-    match.status = MatchStatus.ACCEPTED
-    match.save(update_fields=["status"])
+@transaction.atomic
+def create_ride_request(customer, **fields) -> RequestPipelineResult:
+    """
+    The single entry point for creating ride requests (API and web form alike).
+    Each stage runs exactly once; the post_save signal skips requests created here.
+    """
+    timings: Dict[str, float] = {}
+    with _stage(timings, "create"):
+        fields.setdefault("expires_at", timezone.now() + request_ttl())
+        req = RideRequest(customer=customer, **fields)
+        req._created_by_pipeline = True
+        req.save()
+    run_request_pipeline(req, timings)
+    logger.debug("RideRequest #%s pipeline timings (ms): %s", req.pk, timings)
+    return RequestPipelineResult(request=req, timings_ms=timings)
 
-    req.status = RideRequestStatus.MATCHED
-    req.save(update_fields=["status"])
 
+# ---- State transitions ----
+
+def _agreed_amount(req: RideRequest):
     # amount_total: for NEGOTIATED, take last rider or agreed driver offer if exists; else use high estimate
     cfg = get_pricing_config(req.city, req.vehicle_type)
-    amount_total = req.estimated_amount_high
     if cfg.mode == PricingMode.NEGOTIATED:
         latest_offer = NegotiationOffer.objects.filter(request=req).order_by("-created_at").first()
         if latest_offer:
-            amount_total = latest_offer.amount
-
-    ride = Ride.objects.create(
-        driver=match.driver,
-        vehicle=match.vehicle,
-        customer=req.customer,
-        pickup_address=req.pickup_address,
-        dropoff_address=req.dropoff_address,
-        end_address="",
-        pickup_lat=req.pickup_lat,
-        pickup_lng=req.pickup_lng,
-        dropoff_lat=req.dropoff_lat,
-        dropoff_lng=req.dropoff_lng,
-        distance_km=req.distance_km,
-        estimated_amount_low=req.estimated_amount_low,
-        estimated_amount_high=req.estimated_amount_high,
-        amount_total=amount_total,
-        payment_method=req.payment_method,
-        status=RideStatus.ACCEPTED,
-        requested_at=req.requested_at,
-        city=req.city,
-        vehicle_type=req.vehicle_type,
-    )
-
-    drv = match.driver
-    if drv.is_available:
-        drv.is_available = False
-        drv.save(update_fields=["is_available"])
+            return latest_offer.amount
+    return req.estimated_amount_high
+
+def _claim_request(request_id: int) -> bool:
+    """
+    Move an OPEN request to MATCHED; True for exactly one of any number of racing
+    callers. Where the backend has row locks the row is locked first, so losers
+    queue on that one row; on SQLite the conditional UPDATE alone is the claim.
+    """
+    open_req = RideRequest.objects.filter(pk=request_id, status=RideRequestStatus.OPEN)
+    if connection.features.has_select_for_update and not list(open_req.select_for_update().values_list("pk", flat=True)):
+        return False
+    return open_req.update(status=RideRequestStatus.MATCHED) == 1
+
+@instrumented("accept_match")
+def accept_match(match: "RideRequestMatch", driver_user) -> Ride:
+    """
+    Accept a pending match. The request is claimed with a compare-and-set UPDATE
+    as the transaction's first statement, so two drivers racing for the same request
+    get exactly one ride, and the loser fails before writing anything else. Reads
+    (tariff, offers) happen before the transaction to keep the write lock short.
+    """
+    if match.driver.user_id != driver_user.id:
+        raise PermissionDenied("You cannot accept someone else's match.")
+    if match.status != MatchStatus.PENDING:
+        raise ValidationError("Match is not pending.")
+    req = match.request
+    if req.status != RideRequestStatus.OPEN:
+        raise ValidationError("Ride request is not open anymore.")
+    amount_total = _agreed_amount(req)
+
+    with transaction.atomic():
+        if not _claim_request(req.pk):
+            raise ValidationError("Ride request is not open anymore.")
+        won = RideRequestMatch.objects.filter(pk=match.pk, status=MatchStatus.PENDING).update(status=MatchStatus.ACCEPTED)
+        if not won:
+            # rolls the claim back along with the transaction
+            raise ValidationError("Match is not pending.")
+        RideRequestMatch.objects.filter(request_id=req.pk).exclude(pk=match.pk).update(status=MatchStatus.REJECTED)
+
+        ride = Ride.objects.create(
+            driver=match.driver,
+            vehicle=match.vehicle,
+            customer_id=req.customer_id,
+            pickup_address=req.pickup_address,
+            dropoff_address=req.dropoff_address,
+            end_address="",
+            pickup_lat=req.pickup_lat,
+            pickup_lng=req.pickup_lng,
+            dropoff_lat=req.dropoff_lat,
+            dropoff_lng=req.dropoff_lng,
+            distance_km=req.distance_km,
+            estimated_amount_low=req.estimated_amount_low,
+            estimated_amount_high=req.estimated_amount_high,
+            amount_total=amount_total,
+            payment_method=req.payment_method,
+            status=RideStatus.ACCEPTED,
+            requested_at=req.requested_at,
+            city=req.city,
+            vehicle_type=req.vehicle_type,
+        )
+        RideRequest.objects.filter(pk=req.pk).update(ride=ride)
+        # the Ride post_save signal has taken the driver off the available list
 
+    match.status = MatchStatus.ACCEPTED
+    req.status, req.ride = RideRequestStatus.MATCHED, ride
+    # UPDATEs bypass the RideRequest signals that keep the surge counts and status markers
+    transaction.on_commit(lambda: surge_engine.drop_requests([req.pk]))
+    touch_requests([req.pk])
     return ride
 
 @transaction.atomic
@@ -211,6 +445,7 @@ def reject_match(match: RideRequestMatch, driver_user):
     match.status = MatchStatus.REJECTED
     match.save(update_fields=["status"])
 
+@instrumented("start_ride")
 @transaction.atomic
 def start_ride(ride: Ride, driver_user):
     if ride.status != RideStatus.ACCEPTED:
@@ -221,6 +456,7 @@ def start_ride(ride: Ride, driver_user):
     ride.started_at = timezone.now()
     ride.save(update_fields=["status", "started_at"])
 
+@instrumented("complete_ride")
 @transaction.atomic
 def complete_ride(ride: Ride, driver_user, amount_total: Optional[Decimal] = None, end_lat=None, end_lng=None, end_address:str=""):
     if ride.status != RideStatus.IN_PROGRESS:
@@ -244,6 +480,7 @@ def complete_ride(ride: Ride, driver_user, amount_total: Optional[Decimal] = Non
         ride.driver.total_rides = (ride.driver.total_rides or 0) + 1
         ride.driver.save(update_fields=["is_available", "total_rides"])
 
+@instrumented("cancel_ride_request")
 @transaction.atomic
 def cancel_ride_request(req: RideRequest, user):
     if req.customer_id != user.id:
@@ -255,6 +492,62 @@ def cancel_ride_request(req: RideRequest, user):
     RideRequestMatch.objects.filter(request=req, status=MatchStatus.PENDING).update(status=MatchStatus.EXPIRED)
 
 
+# ---- Expiry ----
+
+def request_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "RIDE_REQUEST_TTL_SECONDS", 600))
+
+def match_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "RIDE_MATCH_TTL_SECONDS", 120))
+
+@dataclass
+class ExpirySweepResult:
+    requests: int
+    matches: int
+    elapsed_ms: float
+
+def _update_in_batches(qs, batch_size: int, on_batch=None, **changes) -> int:
+    # pk batches keep each UPDATE (and the write lock it holds) short
+    total = 0
+    while True:
+        ids = list(qs.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += qs.filter(pk__in=ids).update(**changes)
+        if on_batch is not None:
+            on_batch(ids)
+
+def expire_stale(now=None, batch_size: Optional[int] = None) -> ExpirySweepResult:
+    """
+    Expire OPEN requests past `expires_at` (or older than RIDE_REQUEST_TTL_SECONDS when
+    it was never set), then PENDING matches that are older than RIDE_MATCH_TTL_SECONDS
+    or whose request is no longer open. Set-based UPDATEs only; no per-row saves.
+    """
+    t0 = time.perf_counter()
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, "RIDE_EXPIRY_BATCH_SIZE", 500)
+    stale_requests = RideRequest.objects.filter(
+        Q(expires_at__lte=now) | Q(expires_at__isnull=True, requested_at__lte=now - request_ttl()),
+        status=RideRequestStatus.OPEN,
+    ).order_by()
+    # bulk UPDATEs skip signals, so tell the surge counts and status markers directly
+    def requests_expired(ids):
+        surge_engine.drop_requests(ids)
+        touch_requests(ids)
+
+    def matches_expired(ids):
+        touch_requests(set(RideRequestMatch.objects.filter(pk__in=ids).values_list("request_id", flat=True)))
+
+    n_requests = _update_in_batches(stale_requests, batch_size, on_batch=requests_expired,
+                                    status=RideRequestStatus.EXPIRED)
+    stale_matches = RideRequestMatch.objects.filter(
+        Q(created_at__lte=now - match_ttl()) | ~Q(request__status=RideRequestStatus.OPEN),
+        status=MatchStatus.PENDING,
+    ).order_by()
+    n_matches = _update_in_batches(stale_matches, batch_size, on_batch=matches_expired, status=MatchStatus.EXPIRED)
+    return ExpirySweepResult(n_requests, n_matches, round((time.perf_counter() - t0) * 1000.0, 3))
+
+
 # ---- Negotiation helpers ----
 
 @transaction.atomic
@@ -273,10 +566,7 @@ def submit_offer(req: RideRequest, user, role: str, amount: Decimal) -> Negotiat
     # Compute a reference metered price to bound offers (e.g., 50% .. 200%)
     dist_km = req.distance_km
     duration_min = Decimal("0")  # unknown; we can set a nominal value or compute as earlier
-    ref_cfg = PricingConfig(city=req.city, vehicle_type=req.vehicle_type, mode=PricingMode.METERED,
-                            base_fare=Decimal("250.00"), per_km=Decimal("120.00"), per_min=Decimal("10.00"),
-                            booking_fee=Decimal("100.00"), min_fare=Decimal("600.00"), surge_multiplier=Decimal("1.00"),
-                            commission_pct=Decimal("15.00"), active=True)
+    ref_cfg = default_pricing_config(req.city, req.vehicle_type)
     ref_band = metered_quote(dist_km, Decimal("15"), ref_cfg)  # assume 15min nominal
     min_allowed = round_money(ref_band.low * Decimal("0.5"))
     max_allowed = round_money(ref_band.high * Decimal("2.0"))
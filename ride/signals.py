@@ -1,19 +1,44 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.apps import apps
 
-from .models import RideRequest, RideRequestStatus, Ride, RideStatus
+from .changes import touch_requests
+from .models import RideRequest, RideRequestStatus, RideRequestMatch, Ride, RideStatus, PricingConfig
 
 
 @receiver(post_save, sender=RideRequest)
 def on_ride_request_created(sender, instance: RideRequest, created: bool, **kwargs):
-    from .services import compute_request_estimates, build_matches_for_request
-    if not created:
+    from .services import run_request_pipeline
+    if not created or getattr(instance, "_created_by_pipeline", False):
         return
-    compute_request_estimates(instance)
-    Driver = apps.get_model("profiles", "Driver")
-    driver_qs = Driver.objects.all().only("id", "is_available", "current_lat", "current_lng", "vehicle_id")
-    build_matches_for_request(instance, driver_qs=driver_qs, limit=5)
+    # requests saved outside create_ride_request (admin, shell) still get estimated and dispatched
+    run_request_pipeline(instance)
+
+@receiver(post_save, sender=RideRequest)
+def track_request_demand(sender, instance: RideRequest, **kwargs):
+    from .surge import surge_engine
+    pk, lat, lng, is_open = instance.pk, instance.pickup_lat, instance.pickup_lng, instance.status == RideRequestStatus.OPEN
+    transaction.on_commit(lambda: surge_engine.track_request(pk, lat, lng, is_open))
+
+@receiver(post_delete, sender=RideRequest)
+def drop_request_demand(sender, instance: RideRequest, **kwargs):
+    from .surge import surge_engine
+    pk = instance.pk
+    transaction.on_commit(lambda: surge_engine.drop_requests([pk]))
+
+@receiver(post_save, sender=RideRequest)
+def touch_request_status(sender, instance: RideRequest, **kwargs):
+    touch_requests([instance.pk])
+
+@receiver(post_save, sender=RideRequestMatch)
+def touch_match_request_status(sender, instance: RideRequestMatch, **kwargs):
+    touch_requests([instance.request_id])
+
+@receiver(post_save, sender=Ride)
+def touch_ride_request_status(sender, instance: Ride, created: bool, **kwargs):
+    # a new ride is linked to its request afterwards, by accept_match
+    if not created:
+        touch_requests(RideRequest.objects.filter(ride_id=instance.pk).values_list("pk", flat=True))
 
 @receiver(post_save, sender=Ride)
 def sync_driver_availability(sender, instance: Ride, **kwargs):
@@ -28,3 +53,29 @@ def sync_driver_availability(sender, instance: Ride, **kwargs):
         if not drv.is_available:
             drv.is_available = True
             drv.save(update_fields=["is_available"])
+
+DRIVER_INDEX_FIELDS = {"is_available", "current_lat", "current_lng", "vehicle", "vehicle_id"}
+
+@receiver(post_save, sender="profiles.Driver")
+def sync_driver_index_on_save(sender, instance, update_fields=None, **kwargs):
+    from .services import sync_driver_index
+    if update_fields is not None and not DRIVER_INDEX_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: sync_driver_index(instance))
+
+@receiver(post_delete, sender="profiles.Driver")
+def drop_driver_from_index(sender, instance, **kwargs):
+    from .services import get_driver_index
+    from .surge import surge_engine
+    pk = instance.pk
+
+    def drop():
+        get_driver_index().remove(pk)
+        surge_engine.track_driver(pk, None, None, False)
+    transaction.on_commit(drop)
+
+@receiver(post_save, sender=PricingConfig)
+@receiver(post_delete, sender=PricingConfig)
+def invalidate_tariff_cache(sender, **kwargs):
+    from .tariffs import tariff_cache
+    transaction.on_commit(tariff_cache.invalidate)
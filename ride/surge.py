@@ -0,0 +1,150 @@
+from __future__ import annotations
+import threading
+import time
+from collections import Counter
+from decimal import Decimal, ROUND_FLOOR
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from .models import RideRequest, RideRequestStatus
+from .travel import zone_of
+
+Zone = Tuple[int, int]
+
+NO_SURGE = Decimal("1.00")
+SURGE_STEP = Decimal("0.10")
+
+
+class SurgeEngine:
+    """
+    Running counts of open requests (demand) and available drivers (supply) per
+    zone (pickup grid cell of `zone_deg` degrees), moved incrementally as signals
+    report changes. Multipliers are recomputed from the counts at most every
+    `interval` seconds and read from memory.
+
+    Counts only see this process' writes. A full reseed every `reseed_seconds`
+    picks up other workers' writes and any bulk UPDATEs; it costs one query over
+    open requests, so it can run often.
+    """
+
+    def __init__(self, zone_deg: float = 0.02, interval: float = 15.0, reseed_seconds: float = 30.0,
+                 min_demand: int = 3, sensitivity: float = 0.5, max_multiplier: float = 3.0):
+        self.zone_deg = zone_deg
+        self.interval = interval
+        self.reseed_seconds = reseed_seconds
+        self.min_demand = min_demand
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self._requests: Dict[int, Zone] = {}
+        self._drivers: Dict[int, Zone] = {}
+        self._demand: Counter = Counter()
+        self._supply: Counter = Counter()
+        self._multipliers: Dict[Zone, Decimal] = {}
+        self._computed_at: Optional[float] = None
+        self._seeded_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def zone(self, lat, lng) -> Zone:
+        return zone_of(float(lat), float(lng), self.zone_deg)
+
+    # -- incremental updates --
+
+    @staticmethod
+    def _move(members: Dict[int, Zone], counts: Counter, key: int, zone: Optional[Zone]) -> None:
+        prev = members.pop(key, None)
+        if prev is not None:
+            counts[prev] -= 1
+            if counts[prev] <= 0:
+                del counts[prev]
+        if zone is not None:
+            members[key] = zone
+            counts[zone] += 1
+
+    def track_request(self, request_id: int, lat, lng, is_open: bool) -> None:
+        zone = self.zone(lat, lng) if is_open and lat is not None and lng is not None else None
+        with self._lock:
+            self._move(self._requests, self._demand, request_id, zone)
+
+    def drop_requests(self, request_ids: Iterable[int]) -> None:
+        with self._lock:
+            for pk in request_ids:
+                self._move(self._requests, self._demand, pk, None)
+
+    def track_driver(self, driver_id: int, lat, lng, available: bool) -> None:
+        zone = self.zone(lat, lng) if available and lat is not None and lng is not None else None
+        with self._lock:
+            self._move(self._drivers, self._supply, driver_id, zone)
+
+    # -- reads --
+
+    def multiplier(self, lat, lng) -> Decimal:
+        self._ensure_fresh()
+        return self._multipliers.get(self.zone(lat, lng), NO_SURGE)
+
+    def counts(self, lat, lng) -> Tuple[int, int]:
+        """
+        (open requests, available drivers) in the zone around (lat, lng).
+        """
+        self._ensure_fresh()
+        zone = self.zone(lat, lng)
+        return self._demand.get(zone, 0), self._supply.get(zone, 0)
+
+    def multiplier_for(self, demand: int, supply: int) -> Decimal:
+        """
+        1.00 until demand outnumbers supply, then rising by `sensitivity` per unit
+        of excess demand/supply ratio, in 0.10 steps up to `max_multiplier`.
+        """
+        if demand < self.min_demand or demand <= supply:
+            return NO_SURGE
+        ratio = demand / max(supply, 1)
+        raw = Decimal(str(min(self.max_multiplier, 1.0 + self.sensitivity * (ratio - 1.0))))
+        stepped = (raw / SURGE_STEP).to_integral_value(rounding=ROUND_FLOOR) * SURGE_STEP
+        return max(NO_SURGE, stepped.quantize(NO_SURGE))
+
+    # -- schedule --
+
+    def recompute(self) -> Dict[Zone, Decimal]:
+        with self._lock:
+            multipliers = {}
+            for zone, demand in self._demand.items():
+                m = self.multiplier_for(demand, self._supply.get(zone, 0))
+                if m > NO_SURGE:
+                    multipliers[zone] = m
+            self._multipliers = multipliers
+            self._computed_at = time.monotonic()
+            return multipliers
+
+    def seed(self) -> None:
+        """
+        Rebuild the counts from open requests and the driver index.
+        """
+        from .services import get_driver_index
+        requests = {
+            pk: self.zone(lat, lng)
+            for pk, lat, lng in RideRequest.objects.filter(status=RideRequestStatus.OPEN)
+                                                    .values_list("pk", "pickup_lat", "pickup_lng").iterator()
+        }
+        drivers = {e.driver_id: self.zone(e.lat, e.lng) for e in get_driver_index().in_box(-90, 90, -180, 180)}
+        with self._lock:
+            self._requests, self._demand = requests, Counter(requests.values())
+            self._drivers, self._supply = drivers, Counter(drivers.values())
+            self._seeded_at = time.monotonic()
+        self.recompute()
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._seeded_at is None or (self.reseed_seconds and now - self._seeded_at >= self.reseed_seconds):
+            self.seed()
+        elif self._computed_at is None or now - self._computed_at >= self.interval:
+            self.recompute()
+
+
+surge_engine = SurgeEngine(
+    zone_deg=getattr(settings, "RIDE_SURGE_ZONE_DEG", 0.02),
+    interval=getattr(settings, "RIDE_SURGE_RECOMPUTE_SECONDS", 15),
+    reseed_seconds=getattr(settings, "RIDE_SURGE_RESEED_SECONDS", 30),
+    min_demand=getattr(settings, "RIDE_SURGE_MIN_DEMAND", 3),
+    sensitivity=getattr(settings, "RIDE_SURGE_SENSITIVITY", 0.5),
+    max_multiplier=getattr(settings, "RIDE_SURGE_MAX", 3.0),
+)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PricingConfig, PricingMode
+
+VERSION_CACHE_KEY = "ride:pricing-config-version"
+
+
+def tariff_key(city: str, vehicle_type: str) -> Tuple[str, str]:
+    return (city or "").strip().lower(), (vehicle_type or "").strip().lower()
+
+
+def default_pricing_config(city: str, vehicle_type: str) -> PricingConfig:
+    """
+    Unsaved metered tariff used when a city/vehicle type has no active config.
+    """
+    return PricingConfig(
+        city=city, vehicle_type=vehicle_type, mode=PricingMode.METERED,
+        base_fare=Decimal("250.00"), per_km=Decimal("120.00"), per_min=Decimal("10.00"),
+        booking_fee=Decimal("100.00"), min_fare=Decimal("600.00"),
+        surge_multiplier=Decimal("1.00"), commission_pct=Decimal("15.00"), active=True
+    )
+
+
+class TariffCache:
+    """
+    All active PricingConfig rows, held per process and keyed by normalized
+    (city, vehicle_type). Local edits clear it through signals; other workers
+    notice the shared version stamp (in the default Django cache) within
+    `check_interval` seconds, and `ttl` bounds staleness if the cache is not shared.
+    `version` also covers the rows themselves, so a reload that finds changed rows
+    under an unchanged stamp still retires cached quotes.
+    Cached configs are shared between threads and must not be modified.
+    """
+
+    def __init__(self, ttl: float = 30.0, check_interval: float = 2.0):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._configs: Optional[Dict[Tuple[str, str], PricingConfig]] = None
+        self._stamp = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        self._ensure_fresh()
+        return self._version
+
+    def get(self, city: str, vehicle_type: str) -> Optional[PricingConfig]:
+        return self._ensure_fresh().get(tariff_key(city, vehicle_type))
+
+    def for_city(self, city: str) -> List[PricingConfig]:
+        city_key = tariff_key(city, "")[0]
+        return [cfg for (c, _), cfg in self._ensure_fresh().items() if c == city_key]
+
+    def invalidate(self) -> None:
+        """
+        Drop this process' copy and bump the shared stamp so other workers reload too.
+        """
+        cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+        with self._lock:
+            self._configs = None
+
+    def _ensure_fresh(self) -> Dict[Tuple[str, str], PricingConfig]:
+        now = time.monotonic()
+        configs = self._configs
+        if configs is not None and now - self._loaded_at < self.ttl:
+            if now - self._checked_at < self.check_interval:
+                return configs
+            self._checked_at = now
+            if cache.get(VERSION_CACHE_KEY) == self._stamp:
+                return configs
+        return self._load()
+
+    def _load(self) -> Dict[Tuple[str, str], PricingConfig]:
+        with self._lock:
+            stamp = cache.get(VERSION_CACHE_KEY)
+            if stamp is None:
+                stamp = time.time_ns()
+                cache.add(VERSION_CACHE_KEY, stamp, None)
+                stamp = cache.get(VERSION_CACHE_KEY, stamp)
+            configs: Dict[Tuple[str, str], PricingConfig] = {}
+            rows = []
+            for cfg in PricingConfig.objects.filter(active=True).order_by("pk"):
+                configs.setdefault(tariff_key(cfg.city, cfg.vehicle_type), cfg)
+                rows.append(tuple(getattr(cfg, f.attname) for f in cfg._meta.concrete_fields))
+            self._configs = configs
+            self._stamp = stamp
+            self._version = (stamp, hash(tuple(rows)))
+            self._loaded_at = self._checked_at = time.monotonic()
+            return configs
+
+
+tariff_cache = TariffCache(
+    ttl=getattr(settings, "RIDE_PRICING_CACHE_TTL_SECONDS", 30),
+    check_interval=getattr(settings, "RIDE_PRICING_CACHE_CHECK_SECONDS", 2),
+)
@@ -1,3 +1,70 @@
-from django.test import TestCase
+import random
+import threading
+import time
+from collections import Counter
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+
+from .management.commands.stress_accept_matches import Command as StressAcceptMatches
+from .models import MatchStatus, Ride, RideRequestMatch
+from .services import accept_match
+
+
+class ConcurrentAcceptTests(TransactionTestCase):
+    """
+    Every driver is offered every request and all of them race to accept from
+    their own thread; each request must end up with exactly one ride.
+    """
+
+    def test_one_ride_per_request(self):
+        customer, drivers, request_ids = StressAcceptMatches().setup("test", n_requests=5, n_drivers=4)
+        outcomes = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(drivers))
+
+        def run(driver, matches):
+            try:
+                barrier.wait()
+                for match in matches:
+                    while True:
+                        try:
+                            accept_match(match, driver.user)
+                            outcome = "accepted"
+                        except ValidationError:
+                            outcome = "lost"
+                        except OperationalError:
+                            # the in-memory test database reports lock contention instead of waiting
+                            time.sleep(0.001)
+                            continue
+                        break
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = []
+        for i, driver in enumerate(drivers):
+            matches = list(RideRequestMatch.objects.filter(driver=driver).select_related("request", "driver"))
+            random.Random(i).shuffle(matches)
+            threads.append(threading.Thread(target=run, args=(driver, matches)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(outcomes["accepted"], len(request_ids))
+        self.assertEqual(outcomes["lost"], len(request_ids) * (len(drivers) - 1))
+        rides = Counter(Ride.objects.values_list("source_request__pk", flat=True))
+        self.assertEqual(rides, Counter(request_ids))
+        accepted = Counter(RideRequestMatch.objects.filter(status=MatchStatus.ACCEPTED).values_list("request_id", flat=True))
+        self.assertEqual(accepted, Counter(request_ids))
+
+
+class StressAcceptReportTests(TestCase):
+    def test_mismatch_fails_the_command(self):
+        _, _, request_ids = StressAcceptMatches().setup("report", n_requests=2, n_drivers=1)
+        with self.assertRaises(CommandError):
+            StressAcceptMatches().report(Counter(accepted=2), 1.0, request_ids)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import threading
+from collections import defaultdict
+from datetime import datetime
+from math import floor
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Ride, RideStatus, TravelSpeed
+
+DEFAULT_PICKUP_SPEED_KMH = 24.0
+DEFAULT_TRIP_SPEED_KMH = 22.0
+
+
+def zone_of(lat: float, lng: float, zone_deg: float) -> Tuple[int, int]:
+    return floor(lat / zone_deg), floor(lng / zone_deg)
+
+
+def hour_of_week(at: Optional[datetime] = None) -> int:
+    at = timezone.localtime(at or timezone.now())
+    return at.weekday() * 24 + at.hour
+
+
+class SpeedTable:
+    """
+    Learned average speeds, loaded from TravelSpeed once per process into plain dicts.
+    Lookups fall back from (zone, hour of week) to the zone over all hours, then
+    to the hour of week over all zones, then to the caller's default; buckets with
+    fewer than `min_samples` rides are skipped.
+    """
+
+    def __init__(self, zone_deg: float = 0.05, min_samples: int = 5):
+        self.zone_deg = zone_deg
+        self.min_samples = min_samples
+        self._cells: Optional[Dict[Tuple[int, int, int], float]] = None
+        self._zones: Dict[Tuple[int, int], float] = {}
+        self._hours: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ensure_loaded())
+
+    def speed_kmh(self, lat: float, lng: float, at: Optional[datetime] = None,
+                  default: float = DEFAULT_TRIP_SPEED_KMH, how: Optional[int] = None) -> float:
+        """
+        Expected speed around (lat, lng) at `at` (default now); pass `how` instead
+        when the hour of week is already known.
+        """
+        cells = self._ensure_loaded()
+        if not cells and not self._hours:
+            return default
+        how = hour_of_week(at) if how is None else how
+        zone = zone_of(lat, lng, self.zone_deg)
+        speed = cells.get((*zone, how)) or self._zones.get(zone) or self._hours.get(how)
+        return speed or default
+
+    def reload(self) -> None:
+        with self._lock:
+            self._cells = None
+        self._ensure_loaded()
+
+    def _ensure_loaded(self) -> Dict[Tuple[int, int, int], float]:
+        cells = self._cells
+        if cells is not None:
+            return cells
+        with self._lock:
+            if self._cells is None:
+                self._load()
+            return self._cells
+
+    def _load(self) -> None:
+        cells: Dict[Tuple[int, int, int], float] = {}
+        zones = defaultdict(lambda: [0, 0.0, 0.0])
+        hours = defaultdict(lambda: [0, 0.0, 0.0])
+        rows = TravelSpeed.objects.values_list("zone_lat", "zone_lng", "hour_of_week", "samples", "distance_km", "duration_h")
+        for zlat, zlng, how, n, km, h in rows.iterator():
+            if n >= self.min_samples and h > 0:
+                cells[(zlat, zlng, how)] = km / h
+            for agg in (zones[(zlat, zlng)], hours[how]):
+                agg[0] += n
+                agg[1] += km
+                agg[2] += h
+        self._zones = {k: km / h for k, (n, km, h) in zones.items() if n >= self.min_samples and h > 0}
+        self._hours = {k: km / h for k, (n, km, h) in hours.items() if n >= self.min_samples and h > 0}
+        self._cells = cells
+
+
+speed_table = SpeedTable(
+    zone_deg=getattr(settings, "RIDE_SPEED_ZONE_DEG", 0.05),
+    min_samples=getattr(settings, "RIDE_SPEED_MIN_SAMPLES", 5),
+)
+
+
+# ---- Offline build ----
+
+def completed_ride_samples(since: Optional[datetime] = None) -> Iterable[Tuple[float, float, datetime, float, float]]:
+    """
+    (pickup_lat, pickup_lng, started_at, distance_km, duration_h) per completed ride.
+    `distance_km` is the straight-line estimate stored at accept time, so the learned
+    speeds are straight-line km per real hour -- the same units the ETAs use.
+    """
+    qs = Ride.objects.filter(
+        status=RideStatus.COMPLETED, started_at__isnull=False, ended_at__isnull=False, distance_km__gt=0,
+    )
+    if since is not None:
+        qs = qs.filter(ended_at__gte=since)
+    for lat, lng, started, ended, km in qs.values_list(
+            "pickup_lat", "pickup_lng", "started_at", "ended_at", "distance_km").iterator():
+        hours = (ended - started).total_seconds() / 3600.0
+        if hours > 0:
+            yield float(lat), float(lng), started, float(km), hours
+
+
+@transaction.atomic
+def build_speed_table(since: Optional[datetime] = None, min_kmh: float = 3.0,
+                      max_kmh: float = 120.0) -> Tuple[int, int]:
+    """
+    Aggregate completed rides into TravelSpeed, replacing the previous table.
+    Rides implying a speed outside [min_kmh, max_kmh] are treated as bad data.
+    Returns (rides used, rows written).
+    """
+    zone_deg = speed_table.zone_deg
+    buckets = defaultdict(lambda: [0, 0.0, 0.0])
+    used = 0
+    for lat, lng, started, km, hours in completed_ride_samples(since):
+        if not (min_kmh <= km / hours <= max_kmh):
+            continue
+        agg = buckets[(*zone_of(lat, lng, zone_deg), hour_of_week(started))]
+        agg[0] += 1
+        agg[1] += km
+        agg[2] += hours
+        used += 1
+    now = timezone.now()
+    TravelSpeed.objects.all().delete()
+    TravelSpeed.objects.bulk_create([
+        TravelSpeed(zone_lat=zlat, zone_lng=zlng, hour_of_week=how, samples=n,
+                    distance_km=km, duration_h=h, built_at=now)
+        for (zlat, zlng, how), (n, km, h) in buckets.items()
+    ], batch_size=500)
+    return used, len(buckets)
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     RideRequestViewSet, RideRequestMatchViewSet, RideViewSet,
-    PricingConfigViewSet, NegotiationOfferViewSet
+    PricingConfigViewSet, NegotiationOfferViewSet, DriverLocationViewSet
 )
 
 router = DefaultRouter()
@@ -11,5 +11,6 @@ router.register(r"matches", RideRequestMatchViewSet, basename="ride-request-matc
 router.register(r"rides", RideViewSet, basename="ride")
 router.register(r"pricing-configs", PricingConfigViewSet, basename="pricing-config")
 router.register(r"offers", NegotiationOfferViewSet, basename="offers")
+router.register(r"driver-location", DriverLocationViewSet, basename="driver-location")
 
 urlpatterns = [path("", include(router.urls))]
@@ -17,15 +17,28 @@ from .models import (
 from .serializers import (
     RideRequestCreateSerializer, RideRequestSerializer,
     RideRequestMatchSerializer, RideSerializer,
-    PricingConfigSerializer, NegotiationOfferSerializer, RideCompleteSerializer
+    PricingConfigSerializer, NegotiationOfferSerializer, RideCompleteSerializer,
+    DriverLocationSerializer, DriverLocationBatchSerializer
 )
 from .permissions import IsAuthenticatedAndCustomer, IsAuthenticatedAndDriver
+from .quotes import quote_cache, quote_cache_key
+from .metrics import instrumented
+from config.routers import use_replica
 from .services import (
     accept_match, reject_match, start_ride, complete_ride, cancel_ride_request,
-    get_pricing_config, metered_quote
+    get_pricing_config, get_city_pricing_configs, metered_quote, estimate_trips, record_driver_locations,
+    current_surge
 )
 
 
+def _parse_trip(data):
+    try:
+        return (float(data["pickup_lat"]), float(data["pickup_lng"]),
+                float(data["dropoff_lat"]), float(data["dropoff_lng"]))
+    except Exception:
+        return None
+
+
 class RideRequestViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = RideRequest.objects.select_related("customer").all()
     permission_classes = [IsAuthenticated]
@@ -36,11 +49,12 @@ class RideRequestViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mix
         return RideRequestSerializer
 
     def get_permissions(self):
-        if self.action in ("create", "my_requests", "cancel", "quote"):
+        if self.action in ("create", "my_requests", "cancel", "quote", "quote_all"):
             return [IsAuthenticatedAndCustomer()]
         return super().get_permissions()
 
     @action(detail=False, methods=["get"])
+    @use_replica
     def my_requests(self, request):
         qs = self.get_queryset().filter(customer=request.user)
         return Response(RideRequestSerializer(qs, many=True).data)
@@ -52,43 +66,95 @@ class RideRequestViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mix
         return Response(RideRequestSerializer(req).data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["post"])
+    @instrumented("quote")
     def quote(self, request):
         """
         Metered quick quote without creating a request (for preview screens).
         body: {pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, city, vehicle_type}
         """
         data = request.data
-        try:
-            pickup_lat = float(data["pickup_lat"]); pickup_lng = float(data["pickup_lng"])
-            dropoff_lat = float(data["dropoff_lat"]); dropoff_lng = float(data["dropoff_lng"])
-        except Exception:
+        trip = _parse_trip(data)
+        if trip is None:
             return Response({"detail": "Invalid coordinates."}, status=400)
         city = data.get("city", "Lagos")
         vehicle_type = data.get("vehicle_type", "Standard")
+        surge = current_surge(trip[0], trip[1])
+        key = quote_cache_key(*trip, city, vehicle_type, surge=surge)
+        payload = quote_cache.get(key)
+        if payload is None:
+            payload = self._quote(trip, city, vehicle_type, surge)
+            quote_cache.set(key, payload)
+        return Response(payload)
+
+    def _quote(self, trip, city, vehicle_type, surge=None):
+        pickup_lat, pickup_lng, dropoff_lat, dropoff_lng = trip
         cfg = get_pricing_config(city, vehicle_type)
 
         if cfg.mode != PricingMode.METERED:
-            return Response({"mode": cfg.mode, "detail": "Negotiated mode: no metered quote."}, status=200)
+            return {"mode": cfg.mode, "detail": "Negotiated mode: no metered quote."}
 
         # rough straight-line distance & duration
-        from .services import haversine_km, _estimate_eta_min
-        dist_km = Decimal(str(round(haversine_km(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng), 2)))
-        duration_min = Decimal(str(_estimate_eta_min(float(dist_km), avg_speed_kmh=22.0)))
-        band = metered_quote(dist_km, duration_min, cfg)
-        return Response({
+        (dist_km, duration_min), = estimate_trips([pickup_lat], [pickup_lng], [dropoff_lat], [dropoff_lng])
+        band = metered_quote(dist_km, duration_min, cfg, surge=surge)
+        return {
             "mode": cfg.mode,
             "city": city,
             "vehicle_type": vehicle_type,
             "distance_km": str(dist_km),
             "low": str(band.low),
             "high": str(band.high),
-            "surge": str(cfg.surge_multiplier),
+            "surge": str(cfg.surge_multiplier if surge is None else surge),
             "min_fare": str(cfg.min_fare),
-        })
-        
+        }
+
+    @action(detail=False, methods=["post"], url_path="quote-all")
+    def quote_all(self, request):
+        """
+        Quotes for every active vehicle type in the city from one distance/duration estimate.
+        body: {pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, city}
+        """
+        data = request.data
+        trip = _parse_trip(data)
+        if trip is None:
+            return Response({"detail": "Invalid coordinates."}, status=400)
+        city = data.get("city", "Lagos")
+        surge = current_surge(trip[0], trip[1])
+        key = quote_cache_key(*trip, city, "*", surge=surge)
+        payload = quote_cache.get(key)
+        if payload is None:
+            payload = self._quote_all(trip, city, surge)
+            quote_cache.set(key, payload)
+        return Response(payload)
+
+    def _quote_all(self, trip, city, surge=None):
+        pickup_lat, pickup_lng, dropoff_lat, dropoff_lng = trip
+        (dist_km, duration_min), = estimate_trips([pickup_lat], [pickup_lng], [dropoff_lat], [dropoff_lng])
+        products = []
+        for cfg in get_city_pricing_configs(city):
+            if cfg.mode != PricingMode.METERED:
+                products.append({"vehicle_type": cfg.vehicle_type, "mode": cfg.mode, "negotiated": True,
+                                 "low": None, "high": None})
+                continue
+            band = metered_quote(dist_km, duration_min, cfg, surge=surge)
+            products.append({
+                "vehicle_type": cfg.vehicle_type,
+                "mode": cfg.mode,
+                "negotiated": False,
+                "low": str(band.low),
+                "high": str(band.high),
+                "surge": str(cfg.surge_multiplier if surge is None else surge),
+                "min_fare": str(cfg.min_fare),
+            })
+        return {
+            "city": city,
+            "distance_km": str(dist_km),
+            "duration_min": str(duration_min),
+            "products": products,
+        }
+
 
 class RideRequestMatchViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
-    queryset = RideRequestMatch.objects.select_related("request", "driver", "vehicle").all()
+    queryset = RideRequestMatch.objects.select_related("request", "driver__user", "vehicle").all()
     serializer_class = RideRequestMatchSerializer
     permission_classes = [IsAuthenticatedAndDriver]
 
@@ -141,6 +207,7 @@ class RideViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.Gen
         return Response(RideSerializer(ride).data)
 
     @action(detail=False, methods=["get"])
+    @use_replica
     def my_rides(self, request):
         qs = self.get_queryset()
         return Response(RideSerializer(qs, many=True).data)
@@ -151,6 +218,13 @@ class PricingConfigViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mix
     serializer_class = PricingConfigSerializer
     permission_classes = [IsAdminUser]
 
+    @action(detail=False, methods=["get"], url_path="quote-cache")
+    def quote_cache_stats(self, request):
+        """
+        Hit/miss counters of this worker's quote cache, for sizing it.
+        """
+        return Response(quote_cache.stats())
+
 
 class NegotiationOfferViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     queryset = NegotiationOffer.objects.select_related("request", "user").all()
@@ -170,3 +244,30 @@ class NegotiationOfferViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, vi
         from .services import submit_offer
         offer = submit_offer(req, self.request.user, role, amount)
         serializer.instance = offer
+
+
+class DriverLocationViewSet(viewsets.GenericViewSet):
+    """
+    Drivers push their live position here, one ping at a time or as a batch.
+    Writes are buffered; only the latest position per driver reaches the database.
+    """
+    serializer_class = DriverLocationSerializer
+    permission_classes = [IsAuthenticatedAndDriver]
+
+    def create(self, request):
+        ser = DriverLocationSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        return self._record(request, [ser.validated_data])
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        ser = DriverLocationBatchSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        return self._record(request, ser.validated_data["pings"])
+
+    def _record(self, request, pings):
+        accepted = record_driver_locations(
+            request.user.driver_profile,
+            [(p["lat"], p["lng"], p.get("recorded_at")) for p in pings],
+        )
+        return Response({"accepted": accepted}, status=status.HTTP_202_ACCEPTED)
@@ -81,28 +81,50 @@ function attachRideFormSubmit(){
   });
 }
 
-// Polling logic for customer ride status
+// Status updates for customer ride status
+function renderRequestStatus(j){
+  document.getElementById("rr-status").textContent = j.status;
+  const list = document.getElementById("matches-list");
+  list.innerHTML = "";
+  (j.matches || []).forEach(m=>{
+    const el = document.createElement("div");
+    el.className = "list-group-item";
+    el.innerHTML = `<div><strong>${m.driver__user__username}</strong> — ${m.status} <div class="small text-muted">Dist: ${m.distance_to_pickup_km}km • ETA ${m.eta_to_pickup_min}min</div></div>`;
+    list.appendChild(el);
+  });
+  if (j.ride) {
+    const r = j.ride;
+    const ri = document.getElementById("ride-info");
+    ri.innerHTML = `<div class="alert alert-info">Matched to <strong>${r.driver}</strong> — Ride #${r.id} • Status: ${r.status}</div>`;
+  }
+}
+
 async function pollRequest(){
   if (typeof REQUEST_ID === 'undefined') return;
   const url = `/customer/poll/${REQUEST_ID}/`;
   try {
     const res = await fetch(url);
-    const j = await res.json();
-    document.getElementById("rr-status").textContent = j.status;
-    const list = document.getElementById("matches-list");
-    list.innerHTML = "";
-    (j.matches || []).forEach(m=>{
-      const el = document.createElement("div");
-      el.className = "list-group-item";
-      el.innerHTML = `<div><strong>${m.driver__user__username}</strong> — ${m.status} <div class="small text-muted">Dist: ${m.distance_to_pickup_km}km • ETA ${m.eta_to_pickup_min}min</div></div>`;
-      list.appendChild(el);
-    });
-    if (j.ride) {
-      const r = j.ride;
-      const ri = document.getElementById("ride-info");
-      ri.innerHTML = `<div class="alert alert-info">Matched to <strong>${r.driver}</strong> — Ride #${r.id} • Status: ${r.status}</div>`;
-    }
+    renderRequestStatus(await res.json());
   } catch (e){
     console.error(e);
   }
 }
+
+// Long-poll: the server answers only when something changed (or after ~25s),
+// so the page stays current with a fraction of the requests of fixed polling.
+async function streamRequestStatus(){
+  if (typeof REQUEST_ID === 'undefined') return;
+  let token = "";
+  while (true) {
+    try {
+      const res = await fetch(`/customer/poll/${REQUEST_ID}/wait/?since=${encodeURIComponent(token)}`);
+      if (!res.ok) throw new Error(`status ${res.status}`);
+      const j = await res.json();
+      if (j.token !== token) renderRequestStatus(j);
+      token = j.token;
+    } catch (e){
+      console.error(e);
+      await new Promise(r => setTimeout(r, 5000));
+    }
+  }
+}
@@ -13,6 +13,7 @@ urlpatterns = [
     path("customer/request/", views.request_ride, name="request_ride"),
     path("customer/ride-status/<int:pk>/", views.ride_status, name="ride_status"),
     path("customer/poll/<int:request_id>/", views.poll_request_status, name="poll_request_status"),
+    path("customer/poll/<int:request_id>/wait/", views.wait_request_status, name="wait_request_status"),
 
     # driver
     path("driver/dashboard/", views.driver_dashboard, name="driver_dashboard"),
@@ -1,15 +1,25 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest, Http404
 
 from .forms import LoginForm, RegisterForm, RideRequestForm
 from ride.models import RideRequest, RideRequestMatch, Ride, RideRequestStatus, MatchStatus
 from profiles.models import Customer, Driver
 from ride import services as ride_services
+from ride.changes import request_marker
+from config.routers import use_replica
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
 def index(request):
     if request.user.is_authenticated:
@@ -61,6 +71,7 @@ def register_view(request):
     return render(request, "auth/register.html", {"form": form})
 
 @login_required
+@use_replica
 def customer_dashboard(request):
     # Show customer's ride requests and active rides
     try:
@@ -68,7 +79,7 @@ def customer_dashboard(request):
     except Customer.DoesNotExist:
         return HttpResponseForbidden("Not a customer account.")
     requests = RideRequest.objects.filter(customer=request.user).order_by("-requested_at")[:10]
-    active_rides = Ride.objects.filter(customer=request.user).exclude(status__in=[RideRequestStatus.CANCELED, "COMPLETED"]).order_by("-requested_at")
+    active_rides = Ride.objects.filter(customer=request.user).exclude(status__in=[RideRequestStatus.CANCELED, "COMPLETED"]).select_related("source_request").order_by("-requested_at")
     return render(request, "customer/dashboard.html", {"requests": requests, "active_rides": active_rides})
 
 @login_required
@@ -80,8 +91,8 @@ def request_ride(request):
     if request.method == "POST":
         form = RideRequestForm(request.POST)
         if form.is_valid():
-            rr = RideRequest.objects.create(
-                customer=request.user,
+            rr = ride_services.create_ride_request(
+                request.user,
                 pickup_address=form.cleaned_data["pickup_address"],
                 dropoff_address=form.cleaned_data["dropoff_address"],
                 pickup_lat=form.cleaned_data["pickup_lat"],
@@ -91,13 +102,7 @@ def request_ride(request):
                 payment_method=form.cleaned_data["payment_method"],
                 city=form.cleaned_data.get("city", "Lagos"),
                 vehicle_type=form.cleaned_data.get("vehicle_type", "Standard"),
-            )
-            # compute estimates + matches (signals already run on save; but just in case)
-            ride_services.compute_request_estimates(rr)
-            from django.apps import apps
-            DriverModel = apps.get_model("profiles", "Driver")
-            driver_qs = DriverModel.objects.all().only("id", "is_available", "current_lat", "current_lng", "vehicle_id")
-            ride_services.build_matches_for_request(rr, driver_qs=driver_qs, limit=5)
+            ).request
             return redirect("ride_status", rr.pk)
     else:
         form = RideRequestForm()
@@ -111,12 +116,14 @@ def ride_status(request, pk):
 
 @login_required
 def driver_dashboard(request):
+    # stays on the primary: offers are written by the dispatcher, not this driver,
+    # so the pin cookie would not hide replica lag here
     try:
         drv = request.user.driver_profile
     except Driver.DoesNotExist:
         return HttpResponseForbidden("Not a driver account.")
     # show pending matches
-    matches = RideRequestMatch.objects.filter(driver=drv).order_by("created_at")
+    matches = RideRequestMatch.objects.filter(driver=drv).select_related("request").order_by("created_at")
     active_rides = Ride.objects.filter(driver=drv).exclude(status__in=["COMPLETED", "CANCELED"]).order_by("-requested_at")
     return render(request, "driver/dashboard.html", {"matches": matches, "active_rides": active_rides})
 
@@ -158,13 +165,81 @@ def reject_match_view(request, match_id):
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
     return JsonResponse({"ok": True})
 
-@login_required
-def poll_request_status(request, request_id):
-    rr = get_object_or_404(RideRequest, pk=request_id, customer=request.user)
+def _load_request(request_id, user):
+    return RideRequest.objects.select_related("ride__driver__user").filter(pk=request_id, customer=user).first()
+
+def _status_token(rr):
+    # fingerprint of everything the status screen shows, without building it
+    states = list(rr.matches.order_by("pk").values_list("pk", "status"))
+    ride_state = (rr.ride.pk, rr.ride.status) if rr.ride else None
+    return hashlib.sha1(repr((rr.status, states, ride_state)).encode()).hexdigest()[:16]
+
+def _status_payload(rr):
     matches = list(rr.matches.order_by("created_at").values("id", "driver__user__username", "status", "distance_to_pickup_km", "eta_to_pickup_min"))
-    # check if matched -> find ride
-    ride = Ride.objects.filter(customer=request.user, pickup_lat=rr.pickup_lat, pickup_lng=rr.pickup_lng, requested_at=rr.requested_at).first()
     ride_info = None
+    ride = rr.ride
     if ride:
-        ride_info = {"id": ride.id, "status": ride.status, "driver": getattr(ride.driver.user, "username", None)}
-    return JsonResponse({"status": rr.status, "matches": matches, "ride": ride_info})
+        ride_info = {"id": ride.id, "status": ride.status, "driver": getattr(ride.driver.user, "username", None) if ride.driver else None}
+    return {"status": rr.status, "matches": matches, "ride": ride_info}
+
+@login_required
+def poll_request_status(request, request_id):
+    rr = _load_request(request_id, request.user)
+    if rr is None:
+        raise Http404
+    token = _status_token(rr)
+    etag = quote_etag(token)
+    # unchanged polls (If-None-Match) get a 304 without building the payload
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        payload = _status_payload(rr)
+        payload["token"] = token
+        response = JsonResponse(payload)
+    response["ETag"] = etag
+    return response
+
+def _current_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+def _request_state(request_id, user):
+    # the marker is read first, so a change landing during the load still moves it
+    marker = request_marker(request_id)
+    rr = _load_request(request_id, user)
+    return rr, _status_token(rr) if rr else None, marker
+
+async def wait_request_status(request, request_id):
+    """
+    Long-poll variant of poll_request_status: holds the connection until the status
+    token differs from `?since=` (or the wait times out) and then answers with the
+    same payload. Under config.asgi the wait costs no worker thread.
+
+    While waiting it only reads the request's status marker from the cache, and
+    reloads the request when the marker moves, every RIDE_STATUS_FULL_CHECK_SECONDS
+    (for changes whose marker bump this process cannot see) and at the deadline.
+    """
+    user = await sync_to_async(_current_user)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication required."}, status=401)
+    since = request.GET.get("since")
+    timeout = getattr(settings, "RIDE_STATUS_LONGPOLL_SECONDS", 25)
+    interval = getattr(settings, "RIDE_STATUS_CHECK_INTERVAL_SECONDS", 1)
+    full_check = getattr(settings, "RIDE_STATUS_FULL_CHECK_SECONDS", 10)
+    deadline = time.monotonic() + timeout
+    while True:
+        rr, token, marker = await sync_to_async(_request_state)(request_id, user)
+        if rr is None:
+            return JsonResponse({"detail": "Not found."}, status=404)
+        loaded_at = time.monotonic()
+        if token != since or loaded_at >= deadline:
+            break
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            if now >= deadline or now - loaded_at >= full_check:
+                break
+            if await sync_to_async(request_marker)(request_id) != marker:
+                break
+    payload = await sync_to_async(_status_payload)(rr)
+    payload["token"] = token
+    return JsonResponse(payload)